@@ -0,0 +1,228 @@
+import pandas as pd
+import numpy as np
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import json
+import os
+import platform
+import resource
+import sys
+import time
+
+import datacleaning
+
+# benchmark for datacleaning.py
+# generates fake "PA Log Sheet" exports (as csv, the sizes we care about dont fit in a workbook) that are about as
+# messy as the real sheet, then times every clean_* function on its own and clean_data end to end for each engine.
+# every measurement runs in a fresh process so the peak memory we report is really that run's.
+# results go to a json file so runs from different commits can be compared.
+#
+#   python benchmark.py --sizes 10000 100000 1000000 --engines vectorized unique
+#   python benchmark.py --sizes 10000000 --engines unique --chunksize 200000 --skip-functions
+
+# *** synthetic pa log ***
+# value pools copied from the kinds of entries the real sheet has (typos, stray spaces, 'Missing', mixed formats)
+pools = {
+    'Request Status': ['Approved'] * 14 + ['Pending'] * 2 + ['Denied'],
+    'Reason - Pending/No': [None] * 30 + ['EV', 'POI', 'HS', 'Follow up', 'follow up', 'POI, EV', 'HS, POI, EV',
+                                          'deceased', 'not eligible', 'over income', 'no balance', 'hospice'],
+    'Pt City': ['Lincoln', 'Omaha', 'OMAHA', 'Grand Island', 'GRAND ISLAND', 'Hastings', 'Beatrice', 'Kearney',
+                'York', 'Columbus', 'Gretna', 'lincoln ', "O'Neill", 'North Platte', 'Missing', None],
+    'Pt State': ['NE'] * 20 + ['NE ', 'Ne', 'ne', 'IA', 'ia', 'Iowa', 'KS', 'SD', 'Florida', 'Missing', None],
+    'Language': ['English'] * 12 + ['Spanish', 'English ', 'Vietnamese', 'Karen', 'English, Spanish', 'somali',
+                                    'Russian', 'Missing', None],
+    'Marital Status': ['Single', 'Married', 'Divorced', 'Widowed', 'Domestic Partnership', 'Seperated', 'Separated',
+                       'married', 'SIngle ', 'MIssing', 'Missing', None],
+    'Gender': ['Female'] * 6 + ['Male'] * 4 + ['MAle', 'Male ', 'Transgender Female', 'Missing', None],
+    'Race': ['White'] * 10 + ['Black or African American', 'Asian', 'Other', 'Decline to answer', 'Hispanic',
+                              'American Indian or Alaskan Native', 'American Indian or Alaksa Native', 'whiate',
+                              'Two or more races', 'missing', 'Missing', None],
+    'Hispanic/Latino': ['Non-Hispanic or Latino', 'Hispanic or Latino', 'No', 'Yes', 'Decline to answer',
+                        'Non-hispanic', 'non-hispanic or latino ', 'Hispanic of Latino ', 'Missing', None],
+    'Sexual Orientation': ['Straight'] * 6 + ['Heterosexual', 'Gay or lesbian', 'Decline to answer', "I don't know",
+                                             'Striaght', 'Stright', 'straight ', 'MIssing', 'Missing', None],
+    'Insurance Type': ['Private', 'Medicare', 'Medicaid', 'Uninsured', 'Medicare & Medicaid', 'Medicare & Other',
+                       'Medicare & Private', 'Military Program', 'Uninsurred', 'MEdicare', 'Unisured', 'Missing', None],
+    'Household Size': ['1', '2', '3', '4', '5', '6', '0', '10', 'missing', 'Missing', None],
+    'Referral Source': ['NCS', 'Bryan Health', 'NHO', 'Nebraska Medicine', 'Nebraska Medicine ', 'MCC', 'CPN', 'MECC',
+                        'Hematology and Oncology Consultants',
+                        'Columbus Community Hospital/Hemotology & Oncology Consultants',
+                        'CHI Health St Francis Cancer Center', 'June E Nylen Cancer Center', 'social worker', None],
+    'Referred By:': ['LM', 'AJS', 'AG', 'TG', 'Julie Dragoo', 'Joselyn Hayes', 'Jane Cogan', 'LISA MONTANEZ',
+                     'Angela Wulf', 'Missing', None],
+    'Type of Assistance (CLASS)': ['Food/Groceries', 'Housing', 'Utilities', 'Medical Supplies/Prescription Co-pay(s)',
+                                   'Gas', 'Car Payment', 'Multiple', 'Hotel', 'Other', 'Phone/Internet',
+                                   'Phone/internet', 'Utilities ', 'Food/groceries', 'utilities '],
+    'Payment Method': ['PFA GC', 'GC', 'gc', 'cc', 'CC', 'ck', 'Ck', 'Check', 'check', 'ACH', 'EFT', 'HyVee GC',
+                       'Missing', None],
+    'Payable to:': ['Walmart', 'WALMART', 'walmart', 'Caseys', "Casey's", 'Hy-Vee', 'OPPD', 'LES', 'MUD', 'BHE',
+                    'U Save Pharmacy', 'Black Hills Energy', 'u-save pharmacy llc', 'Missing', None],
+    'Patient Letter Notified? (Directly/Indirectly through rep)': [None] * 8 + ['Yes', ' Yes ', 'No', 'Missing',
+                                                                              '2022-11-18 00:00:00', '9/30/2022'],
+    'Application Signed?': [None] * 8 + ['Yes', 'yes', 'YES', 'No', 'no', 'Missing'],
+    'Notes': [None] * 40 + ['NCS Service Recovery', 'Time sensitive, please review', 'Bills missing',
+                            'Waiting on HS ', 'Need no income form'],
+}
+
+zip_codes = ['68516', '68901', '68521', '68801', '68803', '68506', '68510', '68504', '68114', '68144', '68502',
+             '68310', '68850', '68601', '51501', '68516-1234', '6851', 'Missing', None]
+
+
+def pick(rng, values, n):
+    return np.asarray(values, dtype=object)[rng.integers(0, len(values), n)]
+
+
+# dates the way they come out of the workbook ('2024-10-09 00:00:00') mixed with ones typed in as text
+def random_dates(rng, n, start, end):
+    start = pd.Timestamp(start)
+    days = pd.to_timedelta(rng.integers(0, (pd.Timestamp(end) - start).days, n), unit='D')
+    dates = pd.Series(start + days)
+    typed = rng.random(n) < 0.1
+    return np.where(typed, dates.dt.strftime('%m/%d/%Y'), dates.dt.strftime('%Y-%m-%d %H:%M:%S'))
+
+
+# sprinkle some of the cells of a column with the given junk values
+def with_junk(rng, values, junk, share):
+    values = np.asarray(values, dtype=object)
+    hit = rng.random(len(values)) < share
+    values[hit] = pick(rng, junk, int(hit.sum()))
+    return values
+
+
+def synthetic_pa_log(n, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(index=range(n))
+
+    df['Patient ID#'] = rng.integers(200000, 260000, n)
+    df['Grant Req Date'] = random_dates(rng, n, '2019-01-01', '2025-06-30')
+    df['App Year'] = rng.integers(1, 7, n)
+    df['Remaining Balance'] = np.round(rng.normal(700, 600, n), 2)
+    df['Request Status'] = pick(rng, pools['Request Status'], n)
+
+    # mostly 'Yes', but plenty of payment dates (a few after the request, like the real sheet)
+    df['Payment Submitted?'] = with_junk(rng, random_dates(rng, n, '2019-01-15', '2025-07-30'),
+                                         ['Yes'] * 8 + ['No', 'yes'], 0.7)
+    df['Reason - Pending/No'] = pick(rng, pools['Reason - Pending/No'], n)
+    df['Pt City'] = pick(rng, pools['Pt City'], n)
+    df['Pt State'] = pick(rng, pools['Pt State'], n)
+    df['Pt Zip'] = pick(rng, zip_codes, n)
+    df['Language'] = pick(rng, pools['Language'], n)
+    df['DOB'] = with_junk(rng, random_dates(rng, n, '1930-01-01', '2010-12-31'), ['Missing', '1/1/1962', None], 0.5)
+    for column in ['Marital Status', 'Gender', 'Race', 'Hispanic/Latino', 'Sexual Orientation', 'Insurance Type',
+                   'Household Size']:
+        df[column] = pick(rng, pools[column], n)
+    df['Total Household Gross Monthly Income'] = with_junk(
+        rng, rng.integers(0, 9000, n).astype(str), ['Missing', None, '3852.63', '$2,400', '0'], 0.2)
+    df['Distance roundtrip/Tx'] = with_junk(rng, rng.integers(1, 200, n).astype(str),
+                                            ['Missing', 'missing', None, '5-130'], 0.25)
+    df['Referral Source'] = pick(rng, pools['Referral Source'], n)
+    df['Referred By:'] = pick(rng, pools['Referred By:'], n)
+    df['Type of Assistance (CLASS)'] = pick(rng, pools['Type of Assistance (CLASS)'], n)
+    df['Amount'] = with_junk(rng, pick(rng, ['100', '50', '250', '200', '25', '1500', '500', '75', '1000'], n),
+                             ['$1,200', '$ 2.563.57', '80.00', '25.5', 'Missing', None], 0.1)
+    for column in ['Payment Method', 'Payable to:', 'Patient Letter Notified? (Directly/Indirectly through rep)',
+                   'Application Signed?', 'Notes']:
+        df[column] = pick(rng, pools[column], n)
+    return df
+
+
+# write n rows in blocks so even 10M rows never sit in memory at once
+def write_pa_log(path, n, seed=0, block=100000):
+    for number, start in enumerate(range(0, n, block)):
+        rows = min(block, n - start)
+        synthetic_pa_log(rows, seed=seed + number).to_csv(path, index=False, mode='w' if number == 0 else 'a',
+                                                          header=number == 0)
+
+
+# *** measurements (each one runs in its own process) ***
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes, macos bytes
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+
+def time_functions(path, engine, rows):
+    df = datacleaning.rename_columns(pd.read_csv(path, nrows=rows))
+    cleaners = datacleaning.column_cleaners + [('remaining_balance', datacleaning.clean_remaining_balance)]
+
+    results = []
+    for column, cleaner in cleaners:
+        if engine == 'vectorized' and cleaner is datacleaning.clean_remaining_balance:
+            cleaner = datacleaning.clean_remaining_balance_vectorized
+            start = time.perf_counter()
+            cleaner(df[column])
+        else:
+            start = time.perf_counter()
+            datacleaning.clean_column(df[column], cleaner, engine)
+        seconds = time.perf_counter() - start
+        results.append({'stage': cleaner.__name__, 'column': column, 'rows': len(df), 'seconds': seconds})
+    return results
+
+
+def time_clean_data(path, engine, chunksize, workers):
+    start = time.perf_counter()
+    if chunksize:
+        rows = datacleaning.clean_csv_chunks(path, os.devnull, chunksize, engine=engine, workers=workers)
+    else:
+        rows = len(datacleaning.clean_data(path, engine=engine, workers=workers))
+    seconds = time.perf_counter() - start
+    return {'stage': 'clean_data', 'column': None, 'rows': rows, 'seconds': seconds, 'peak_rss_mb': peak_rss_mb()}
+
+
+def in_fresh_process(function, *args):
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        return pool.submit(function, *args).result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time datacleaning.py on synthetic PA log exports")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000],
+                        help="number of rows to generate, one benchmark per size (default 10000 100000)")
+    parser.add_argument("--engines", nargs="+", choices=datacleaning.engines, default=datacleaning.engines)
+    parser.add_argument("--function-rows", type=int, default=1000000,
+                        help="time the single clean_* functions on at most this many rows (default 1000000)")
+    parser.add_argument("--skip-functions", action="store_true", help="only time clean_data end to end")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="run clean_data in streaming mode with this chunk size (needed for the biggest sizes)")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--data-dir", default="benchmark_data",
+                        help="where the generated csv files are kept (reused if they already exist)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.json")
+    args = parser.parse_args()
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    results = []
+    for size in args.sizes:
+        path = os.path.join(args.data_dir, f"pa_log_{size}_{args.seed}.csv")
+        if not os.path.exists(path):
+            print(f"Generating {size} rows: {path}")
+            write_pa_log(path, size, seed=args.seed)
+
+        for engine in args.engines:
+            runs = [] if args.skip_functions else in_fresh_process(time_functions, path, engine, min(size, args.function_rows))
+            runs.append(in_fresh_process(time_clean_data, path, engine, args.chunksize, args.workers))
+            for run in runs:
+                run.update({'size': size, 'engine': engine, 'rows_per_second': run['rows'] / run['seconds']})
+                results.append(run)
+            print(f"{size:>10} rows  {engine:<10}  clean_data {runs[-1]['seconds']:8.2f}s  "
+                  f"{runs[-1]['rows_per_second']:>10,.0f} rows/s  peak {runs[-1]['peak_rss_mb']:,.0f} MB")
+
+    with open(args.output, 'w') as f:
+        json.dump({
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'machine': platform.platform(),
+            'cleaner_version': datacleaning.cleaner_version(),
+            'chunksize': args.chunksize,
+            'workers': args.workers,
+            'results': results,
+        }, f, indent=2)
+    print(f"Saved benchmark results to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,547 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import pydeck as pdk
 import plotly.express as px
+from matplotlib.figure import Figure
 import glob
+import io
+import itertools
+import os
+import threading
+import time
+
+import database
+from filters import build_filter_index, value_bitmap, range_bitmap, all_of, apply_filters, bitmap_mask, bitmap_rows
+from rollups import granularities, rollup_path, period_starts, build_rollups, sort_rollups, combine_rollups
+from metrics import metrics_path, load_store, key_metrics
 
 # find clean files (all clean CSV files follow the __CLEAN.csv pattern from datacleaning.py)
-clean_files = glob.glob("*_CLEAN.csv")
-print(f"Found cleaned files: {clean_files}")
+# if datacleaning.py --parquet also wrote a typed .parquet copy next to a csv (and it isnt older than the csv), use that instead
+def clean_data_files(pattern="*_CLEAN.csv"):
+    files = []
+    for csv_file in sorted(glob.glob(pattern)):
+        parquet_file = os.path.splitext(csv_file)[0] + ".parquet"
+        if os.path.exists(parquet_file) and os.path.getmtime(parquet_file) >= os.path.getmtime(csv_file):
+            files.append(parquet_file)
+        else:
+            files.append(csv_file)
+    return files
+
+# the (path, size, mtime) of every file is the dataset version, so the cache below only reloads when a cleaned file changes
+# if datacleaning.py --sqlite built a database, that is the only file and the pages query it instead of loading the data
+def dataset_version():
+    if os.path.exists(database.database_file):
+        files = [database.database_file]
+    else:
+        files = clean_data_files()
+    return tuple((f, os.path.getsize(f), os.path.getmtime(f)) for f in files)
+
+def sqlite_file(version):
+    if version and version[0][0].endswith(".db"):
+        return version[0][0]
+    return None
+
+# run a query against the grants table with the sidebar filters (and any extra conditions) as the where clause
+def sql_query(version, select, filters=(), conditions=(), rest="", params=(), condition_params=()):
+    where, where_params = database.where_clause(filters, conditions, condition_params)
+    return database.query(sqlite_file(version), f"SELECT {select} FROM {database.table_name}{where} {rest}", list(where_params) + list(params))
+
+# columns each page actually uses, so we only read those (None means the page shows every column)
+demographic_columns = [
+    'gender', 'pt_state', 'pt_zip', 'language', 'hispaniclatino', 'sexual_orientation', 'race', 'insurance_type',
+    'total_household_gross_monthly_income', 'marital_status', 'household_size', 'age_category']
+
+page_columns = {
+    "Home Page": [],
+    "Applications Ready for Review": None,
+    "Support Breakdown by Demographics": ['pt_zip', 'lat', 'lng', 'amount', 'patient_id'],
+    "Support Response Time": ['days_to_support'],
+    "Grant Utilization Overview": ['patient_id', 'remaining_balance', 'assistance_type', 'amount'],
+    "Impact & Progress Summary": ['patient_id', 'grant_req_date', 'request_status', 'amount', 'remaining_balance', 'days_to_support'],
+}
+
+# shrink a loaded dataframe so every session shares as little memory as possible: repetitive text columns become
+# categoricals and numbers get the smallest dtype that still holds them exactly (whole-number columns like age and
+# days_to_support become small nullable ints). lat/lng are the only lossy ones, float32 is still well under a metre
+# off. money (amount, remaining_balance) has cents that float32 cant hold, so it stays float64 and the totals dont move
+coordinate_columns = ['lat', 'lng']
+date_columns = ['grant_req_date', 'dob', 'payment_submitted']
+
+def compact_frame(df):
+    for column in df.columns:
+        series = df[column]
+        if column in coordinate_columns:
+            df[column] = series.astype('float32')
+        elif pd.api.types.is_float_dtype(series):
+            values = series.dropna()
+            if len(values) and (values == values.round()).all() and values.abs().max() < 2**31:
+                df[column] = pd.to_numeric(series.astype('Int64'), downcast='integer')
+        elif pd.api.types.is_integer_dtype(series):
+            df[column] = pd.to_numeric(series, downcast='integer')
+        elif series.dtype == object and column not in date_columns and series.nunique() <= len(series) // 2:
+            df[column] = series.astype('category')
+    return df
+
+# streamlit reruns this whole script on every click, so this list starts empty each time and only gets filled on a cache miss
+cache_misses = []
+
+# combine all clean files into a single dataframe, shared across reruns and sessions
+# (cache_resource hands every session the same dataframe, so pages must filter/copy it and never change it in place)
+# a version is loaded with each page's columns plus the filter index, demographic cube and grant date order columns,
+# and the cache has to hold two versions while a reload is warming up
+@st.cache_resource(max_entries=2 * (len(page_columns) + 3), show_spinner="Loading cleaned data...")
+def load_clean_data(version, columns=None):
+    cache_misses.append(version)
+    clean_files = [f for f, size, mtime in version]
+    print(f"Found cleaned files: {clean_files}")
+
+    if columns is not None and len(columns) == 0:
+        return pd.DataFrame()
+
+    df_list = []
+    for f in clean_files:
+        if f.endswith(".parquet"):
+            df_list.append(pd.read_parquet(f, columns=list(columns) if columns is not None else None))
+        else:
+            df_list.append(pd.read_csv(f, usecols=list(columns) if columns is not None else None))
+    df = pd.concat(df_list, ignore_index=True)
+
+    before = df.memory_usage(deep=True).sum()
+    df = compact_frame(df)
+    print(f"Compacted {len(df.columns)} columns from {before / 2**20:.2f} MB to {df.memory_usage(deep=True).sum() / 2**20:.2f} MB")
+    return df
+
+# sidebar filters (label -> column). they apply to every page and are answered from a filter index built once per
+# dataset version (see filters.py), so changing one is a few bitmap operations instead of another pass over the data
+filter_options = {
+    'Request Status': 'request_status',
+    'Assistance Type': 'assistance_type',
+    'App Year': 'app_year',
+    'State': 'pt_state',
+    'Gender': 'gender',
+    'Race': 'race',
+    'Age': 'age_category',
+    'Insurance Type': 'insurance_type',
+}
+range_filter_options = {
+    'Amount': 'amount',
+    'Remaining Balance': 'remaining_balance',
+    'Days to Support': 'days_to_support',
+}
+
+@st.cache_resource(max_entries=2, show_spinner="Indexing filters...")
+def load_filter_index(version):
+    categorical = list(filter_options.values()) + ['application_signed']
+    numeric = list(range_filter_options.values())
+    df = load_clean_data(version, tuple(categorical + numeric))
+    return build_filter_index(df, categorical, numeric)
+
+# choices for the sidebar filters, from the filter index or the database (which also lists its columns for the review page)
+@st.cache_resource(max_entries=2, show_spinner="Loading filter options...")
+def filter_choices(version):
+    db = sqlite_file(version)
+    if db is None:
+        index = load_filter_index(version)
+        return {
+            'values': {column: list(index['values'][column]) for column in filter_options.values()},
+            'ranges': {column: (index['ranges'][column][0][0], index['ranges'][column][0][-1]) if len(index['ranges'][column][0]) else (None, None)
+                       for column in range_filter_options.values()},
+        }
+
+    table = database.table_name
+    return {
+        'values': {column: ['Missing' if value is None else value for value, in database.fetch(db, f"SELECT DISTINCT {column} FROM {table}")]
+                   for column in filter_options.values()},
+        'ranges': {column: database.fetch(db, f"SELECT MIN({column}), MAX({column}) FROM {table}")[0]
+                   for column in range_filter_options.values()},
+        'columns': database.columns(db),
+    }
+
+# the rows of a page's frame that pass the sidebar filters (all of them when nothing is filtered)
+def filter_rows(df, version, filters):
+    if not filters:
+        return df
+    index = load_filter_index(version)
+    return df.iloc[bitmap_rows(index, apply_filters(index, filters))]
+
+# demographic dropdown option -> (column, page header)
+demographic_options = {
+    'Gender': ('gender', "Support Breakdown by Gender"),
+    'Location': ('pt_state', "Support Breakdown by State"),
+    'Zip Code': ('pt_zip', "Support Breakdown by Zip Code"),
+    'Language Spoken': ('language', "Support Breakdown by Language Spoken"),
+    'Hispanic or Latino': ('hispaniclatino', "Support Breakdown by Ethnicity (Hispanic or Latino)"),
+    'Sexuality': ('sexual_orientation', "Support Breakdown by Sexuality"),
+    'Race': ('race', "Support Breakdown by Race"),
+    'Insurance Type': ('insurance_type', "Support Breakdown by Patient's Insurance Type"),
+    'Total Household Gross Monthly Income': ('total_household_gross_monthly_income', "Support Breakdown by Total Household Gross Monthly Income"),
+    'Marital Status': ('marital_status', "Support Breakdown by Marital Status"),
+    'Household Size': ('household_size', "Support Breakdown by Household Size"),
+    'Age': ('age_category', "Support Breakdown by Age"),
+}
+
+# define order for the age categories
+age_order = ["Child", "Young Adult", "Adult", "Senior"]
+
+# aggregate cube for the demographics page: total amount, number of grants and distinct patients for every
+# demographic on its own and for every pair of demographics. built once per dataset version, so switching
+# between options is a dictionary lookup instead of a groupby over every grant
+def build_demographic_cube(df):
+    cube = {}
+    for columns in [(c,) for c in demographic_columns] + list(itertools.combinations(demographic_columns, 2)):
+        cube[columns] = df.groupby(list(columns), observed=True).agg(
+            amount=("amount", "sum"),
+            grants=("amount", "size"),
+            patients=("patient_id", "nunique"),
+        )
+    return cube
+
+@st.cache_resource(max_entries=4, show_spinner="Building demographic summaries...")
+def load_demographic_cube(version, filters=()):
+    df = load_clean_data(version, tuple(demographic_columns + ['amount', 'patient_id']))
+    return build_demographic_cube(filter_rows(df, version, filters))
+
+# look up one or two demographics in the cube (pairs are only stored once, so flip them if needed)
+def cube_rollup(cube, first, second=None):
+    if second is None:
+        return cube[(first,)]
+    if (first, second) in cube:
+        return cube[(first, second)]
+    return cube[(second, first)].swaplevel().sort_index()
+
+# same numbers as the cube, with the database each selected breakdown is its own grouped query
+def demographic_support(version, filters, first, second=None):
+    if sqlite_file(version) is None:
+        return cube_rollup(load_demographic_cube(version, filters), first, second)
+    return demographic_query(version, filters, first, second)
+
+@st.cache_resource(max_entries=32, show_spinner="Querying demographic summaries...")
+def demographic_query(version, filters, first, second=None):
+    columns = [column for column in (first, second) if column is not None]
+    grouped = ", ".join(columns)
+    return sql_query(version, f"{grouped}, TOTAL(amount) AS amount, COUNT(*) AS grants, COUNT(DISTINCT patient_id) AS patients",
+                     filters, [f"{column} IS NOT NULL" for column in columns], f"GROUP BY {grouped} ORDER BY {grouped}").set_index(columns)
+
+# review queue: every row ordered by grant request date is worked out once per dataset version, the pending /
+# signature / sidebar filters are bitmaps from the filter index, and the page only pulls out the rows of the current
+# page (and the columns picked), so st.dataframe gets a small frame no matter how many applications are waiting
+review_columns = [
+    'patient_id', 'grant_req_date', 'app_year', 'amount', 'remaining_balance', 'assistance_type', 'reason_pending',
+    'payable_to', 'application_signed', 'notes']
+signature_values = {'Signed': 'Yes', 'Not Signed': 'No', 'Unsure': 'Missing'}
+
+@st.cache_resource(max_entries=2, show_spinner="Sorting applications...")
+def grant_date_order(version):
+    df = load_clean_data(version, ('grant_req_date',))
+
+    # row positions sorted by grant date, applications without a date go last either way
+    grant_date = pd.to_datetime(df['grant_req_date'], errors='coerce')
+    return {
+        'Newest First': grant_date.sort_values(ascending=False, kind='stable', na_position='last').index.to_numpy(),
+        'Oldest First': grant_date.sort_values(kind='stable', na_position='last').index.to_numpy(),
+    }
+
+# one point per zip for the zip code map (total amount, number of grants, distinct patients and the centroid of
+# the grants), so the map payload grows with the number of zips instead of the number of grants
+@st.cache_resource(max_entries=4, show_spinner="Building zip code map...")
+def zip_map_summary(version, filters=()):
+    if sqlite_file(version):
+        zips = sql_query(version, "pt_zip, TOTAL(amount) AS amount, COUNT(*) AS grants, COUNT(DISTINCT patient_id) AS patients, "
+                         "AVG(lat) AS lat, AVG(lng) AS lng", filters, ["lat IS NOT NULL", "lng IS NOT NULL", "amount IS NOT NULL"],
+                         "GROUP BY pt_zip ORDER BY pt_zip")
+    else:
+        df = load_clean_data(version, tuple(page_columns["Support Breakdown by Demographics"]))
+        df = filter_rows(df, version, filters)
 
-# combine all clean CSV files into a single dataframe
-df_list = [pd.read_csv(f) for f in clean_files]
-stdf = pd.concat(df_list, ignore_index=True)
+        # drop rows without coordinates or amount
+        map_data = df.dropna(subset=["lat", "lng", "amount"])
+
+        zips = map_data.groupby("pt_zip", observed=True).agg(
+            amount=("amount", "sum"),
+            grants=("amount", "size"),
+            patients=("patient_id", "nunique"),
+            lat=("lat", "mean"),
+            lng=("lng", "mean"),
+        ).reset_index()
+    zips["pt_zip"] = zips["pt_zip"].astype(str)
+    zips["lat"] = zips["lat"].astype(float)
+    zips["lng"] = zips["lng"].astype(float)
+
+    # circle area grows with the amount, so the radius goes with its square root
+    zips["radius"] = 500 + 4500 * (zips["amount"].clip(lower=0) / max(zips["amount"].max(), 1)) ** 0.5
+    zips["amount_label"] = zips["amount"].map("${:,.2f}".format)
+    return zips
+
+# per-page summaries, built once per dataset version like the demographic cube, so a rerun from a widget or a
+# page switch only has to draw them. each one reads the same columns its page loads (and is also keyed on the
+# sidebar filters, a few recent filter combinations stay cached)
+@st.cache_resource(max_entries=4, show_spinner="Summarizing response times...")
+def response_time_summary(version, filters=()):
+    if sqlite_file(version):
+        # the database hands back one row per distinct number of days, the statistics are worked out from those counts
+        counts = sql_query(version, "days_to_support, COUNT(*) AS count", filters, ["days_to_support IS NOT NULL"],
+                           "GROUP BY days_to_support ORDER BY days_to_support").set_index('days_to_support')['count']
+        counts.index = pd.to_numeric(counts.index, downcast='integer')
+        return {
+            'describe': pd.Series(counts.index.repeat(counts), name='days_to_support').describe(),
+            'counts': counts,
+        }
+
+    df = load_clean_data(version, tuple(page_columns["Support Response Time"]))
+    df = filter_rows(df, version, filters)
+    return {
+        'describe': df['days_to_support'].dropna().describe(),
+        'counts': df['days_to_support'].value_counts().sort_index(),
+    }
+
+# binning the remaining_balance into categories by 300 increments
+balance_bin_labels = ['0-300', '301-600', '601-900', '901-1200', '1201-1500', '1501+']
+balance_bins = [0, 300, 600, 900, 1200, 1500, float('inf')]
+balance_bin_case = "CASE " + " ".join(f"WHEN remaining_balance <= {high} THEN '{label}'" for high, label in zip(balance_bins[1:-1], balance_bin_labels)) + f" ELSE '{balance_bin_labels[-1]}' END"
+
+@st.cache_resource(max_entries=4, show_spinner="Summarizing grant utilization...")
+def grant_utilization_summary(version, filters=()):
+    if sqlite_file(version):
+        positive = ["remaining_balance > 0"]
+        bins = sql_query(version, f"{balance_bin_case} AS remaining_balance, COUNT(*) AS count", filters, positive, "GROUP BY 1")
+        assistance = sql_query(version, "assistance_type, COUNT(*) AS count, TOTAL(amount) AS amount", filters,
+                               ["assistance_type IS NOT NULL"], "GROUP BY assistance_type ORDER BY assistance_type").set_index('assistance_type')
+        return {
+            'patients_with_positive_balance': sql_query(version, "COUNT(DISTINCT patient_id) AS patients", filters, positive)['patients'][0],
+            'balance_bins': bins.set_index('remaining_balance')['count'].reindex(balance_bin_labels, fill_value=0),
+            'assistance_type_counts': assistance['count'].sort_values(ascending=False, kind='stable'),
+            'assistance_support': assistance['amount'],
+        }
+
+    df = load_clean_data(version, tuple(page_columns["Grant Utilization Overview"]))
+    index = load_filter_index(version)
+    selected = apply_filters(index, filters)
+
+    # patients with a positive remaining balance
+    positive_balance = df.iloc[bitmap_rows(index, all_of(index, [selected, range_bitmap(index, 'remaining_balance', low=0, include_low=False)]))]
+    df = df.iloc[bitmap_rows(index, selected)]
+    balance_bins_column = pd.cut(positive_balance['remaining_balance'], bins=balance_bins, labels=balance_bin_labels)
+
+    return {
+        'patients_with_positive_balance': positive_balance['patient_id'].nunique(),
+        'balance_bins': balance_bins_column.value_counts().sort_index(),
+        'assistance_type_counts': df['assistance_type'].value_counts(),
+        'assistance_support': df.groupby("assistance_type", observed=True)["amount"].sum(),
+    }
+
+# a rollup or metric store older than its csv was left over from an earlier clean
+def fresh_sidecar(data_file, sidecar_file):
+    return os.path.exists(sidecar_file) and os.path.getmtime(sidecar_file) >= os.path.getmtime(os.path.splitext(data_file)[0] + ".csv")
+
+# the metric stores datacleaning.py keeps next to every cleaned file (see metrics.py), None if any is missing or stale
+@st.cache_resource(max_entries=2, show_spinner="Loading key metrics...")
+def load_metric_stores(version):
+    if sqlite_file(version) or not all(fresh_sidecar(f, metrics_path(f)) for f, size, mtime in version):
+        return None
+    return [load_store(metrics_path(f)) for f, size, mtime in version]
+
+# headline numbers for all time or one year / month (period '2024' or '2024-03'). without sidebar filters they come
+# straight from the metric stores, otherwise (or without stores) they are worked out from the data
+@st.cache_resource(max_entries=8, show_spinner="Summarizing impact...")
+def impact_summary(version, filters=(), period=None):
+    stores = load_metric_stores(version)
+    if not filters and stores is not None:
+        return key_metrics(stores, period)
+
+    if sqlite_file(version):
+        in_period, period_params = (["grant_req_date LIKE ?"], [period + '-%']) if period else ([], [])
+        approved = in_period + ["request_status = 'Approved'"]
+        totals = sql_query(version, "TOTAL(amount) AS total_grants, COUNT(DISTINCT patient_id) AS total_patients, COUNT(*) AS total_approved, "
+                           "TOTAL(CASE WHEN remaining_balance < 0 THEN remaining_balance END) AS overspent", filters, approved,
+                           condition_params=period_params).iloc[0]
+        returning_patients = sql_query(version, "patient_id", filters, approved + ["patient_id IS NOT NULL"], "GROUP BY patient_id HAVING COUNT(*) > 1",
+                                       condition_params=period_params)
+        return {
+            'total_grants': totals['total_grants'],
+            'total_patients': int(totals['total_patients']),
+            'total_approved': int(totals['total_approved']),
+            'overspent': abs(totals['overspent']),
+            'num_returning_patients': len(returning_patients),
+            'avg_days': sql_query(version, "AVG(days_to_support) AS avg_days", filters, in_period, condition_params=period_params)['avg_days'][0],
+        }
+
+    df = load_clean_data(version, tuple(page_columns["Impact & Progress Summary"]))
+    index = load_filter_index(version)
+    selected = apply_filters(index, filters)
+    if period:
+        grant_month = pd.to_datetime(df['grant_req_date'], errors='coerce').dt.strftime('%Y-%m')
+        selected = all_of(index, [selected, np.packbits(grant_month.str.startswith(period, na=False).to_numpy())])
+    approved = all_of(index, [selected, value_bitmap(index, 'request_status', ["Approved"])])
+
+    approved_grants = df.iloc[bitmap_rows(index, approved)]
+    returning_patients = approved_grants['patient_id'].value_counts()
+    overspent = df['remaining_balance'].iloc[bitmap_rows(index, all_of(index, [approved, range_bitmap(index, 'remaining_balance', high=0, include_high=False)]))]
+
+    df = df.iloc[bitmap_rows(index, selected)]
+
+    return {
+        'total_grants': approved_grants['amount'].sum(),
+        'total_patients': approved_grants['patient_id'].nunique(),
+        'total_approved': len(approved_grants),
+        'overspent': abs(overspent.sum()),
+        'num_returning_patients': (returning_patients > 1).sum(),
+        'avg_days': df['days_to_support'].mean() if 'days_to_support' in df.columns else None,
+    }
+
+def period_label(period):
+    if period is None:
+        return "All Time"
+    if len(period) == 4:
+        return period
+    return pd.Timestamp(period).strftime("%B %Y")
+
+# daily / weekly / monthly request trend (see rollups.py). without sidebar filters this is just the rollups
+# datacleaning.py stored, with filters (or a cleaned file that has no up to date rollup) it is worked out from the data
+period_sql = {
+    'Daily': "grant_req_date",
+    'Weekly': "date(grant_req_date, 'weekday 0', '-6 days')",
+    'Monthly': "substr(grant_req_date, 1, 7) || '-01'",
+}
+
+@st.cache_resource(max_entries=4, show_spinner="Loading request trends...")
+def request_trend(version, filters=()):
+    db = sqlite_file(version)
+    if db:
+        if not filters and database.fetch(db, "SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?", (database.rollup_table,)):
+            return combine_rollups(database.query(db, f"SELECT * FROM {database.rollup_table}").drop(columns='source_file'))
+        return sort_rollups(pd.concat([
+            sql_query(version, f"'{granularity}' AS granularity, {period} AS period, COUNT(*) AS requests, "
+                      "ROUND(TOTAL(CASE WHEN request_status = 'Approved' THEN amount END), 2) AS approved_amount, "
+                      "COUNT(DISTINCT CASE WHEN request_status = 'Approved' THEN patient_id END) AS patients",
+                      filters, ["grant_req_date IS NOT NULL"], "GROUP BY period")
+            for granularity, period in period_sql.items()], ignore_index=True))
+
+    if not filters and all(fresh_sidecar(f, rollup_path(f)) for f, size, mtime in version):
+        return combine_rollups(pd.concat([pd.read_csv(rollup_path(f), dtype={'period': str}) for f, size, mtime in version], ignore_index=True))
+
+    df = load_clean_data(version, tuple(page_columns["Impact & Progress Summary"]))
+    return build_rollups(filter_rows(df, version, filters))
+
+trend_measures = {
+    'Grant Requests': ('requests', 'Number of Requests'),
+    'Approved Amount': ('approved_amount', 'Approved Amount ($)'),
+    'Patients Served': ('patients', 'Patients Served'),
+}
+period_labels = {'Daily': 'Day', 'Weekly': 'Week', 'Monthly': 'Month'}
+
+# *** figure cache ***
+# drawing is a big share of a rerun on the chart pages, so finished figures are cached on the dataset version, the
+# sidebar filters and the chart settings, and shared by every session. the pie is drawn on a plain matplotlib Figure
+# (pyplot never tracks it, so sessions dont share pyplot's current figure and nothing is left open) and kept as a png,
+# the trend line keeps its plotly figure
+@st.cache_resource(max_entries=8, show_spinner="Drawing chart...")
+def assistance_type_pie(version, filters=()):
+    counts = grant_utilization_summary(version, filters)['assistance_type_counts']
+    if counts.sum() == 0:
+        return None
+
+    fig = Figure(figsize=(8, 8))
+    counts.plot(kind='pie', autopct='%1.1f%%', ylabel='', title='Grants by Assistance Type', ax=fig.subplots())
+    image = io.BytesIO()
+    fig.savefig(image, format='png', dpi=200, bbox_inches='tight')  # same settings st.pyplot used
+    fig.clear()
+    return image.getvalue()
+
+@st.cache_resource(max_entries=16, show_spinner="Drawing chart...")
+def request_trend_figure(version, filters, granularity, measure, start, end):
+    trend = request_trend(version, filters)
+
+    # every week / month that overlaps the picked dates
+    trend = trend[trend['granularity'] == granularity]
+    periods = pd.to_datetime(trend['period'])
+    trend = trend[(periods >= period_starts([start], granularity)[0]) & (periods <= pd.Timestamp(end))]
+
+    column, axis_label = trend_measures[measure]
+    return px.line(
+        trend,
+        x=pd.to_datetime(trend['period']),
+        y=column,
+        labels={'x': period_labels[granularity], column: axis_label},
+        title=f'{granularity} {measure} Over Time'
+    )
+
+# *** hot reload ***
+# a background thread looks at the cleaned files every reload_seconds. once a change has settled (the files look the
+# same on two checks in a row, so one that is still being written is left alone) it builds the new version's data and
+# summaries the pages open with, and only then swaps it in. until that point every session keeps being served the
+# version before, so nobody waits on a reload. the caches hold two versions, so the old one is never evicted mid-build.
+reload_seconds = float(os.environ.get("DASHBOARD_RELOAD_SECONDS", 60))
+
+def warm_caches(version):
+    filter_choices(version)
+    if sqlite_file(version) is None:
+        for columns in page_columns.values():
+            load_clean_data(version, tuple(columns) if columns is not None else None)
+        grant_date_order(version)
+        load_demographic_cube(version, ())
+        load_metric_stores(version)
+    response_time_summary(version, ())
+    grant_utilization_summary(version, ())
+    assistance_type_pie(version, ())
+    impact_summary(version, (), None)
+    request_trend(version, ())
+
+def watch_data(watcher):
+    seen = watcher['version']
+    while True:
+        time.sleep(reload_seconds)
+        try:
+            version = dataset_version()
+            if version != seen:
+                seen = version
+            elif version != watcher['version']:
+                start = time.perf_counter()
+                warm_caches(version)
+                watcher['version'] = version
+                print(f"Swapped in new cleaned data in {time.perf_counter() - start:.1f}s: {[f for f, size, mtime in version]}")
+        except Exception as error:  # e.g. a file removed between the glob and the stat
+            print(f"Reloading cleaned data failed, still serving the previous version: {error}")
+
+# one watcher per server process, the version it holds is the one every session is served
+@st.cache_resource(show_spinner=False)
+def data_watcher():
+    watcher = {'version': dataset_version()}
+    threading.Thread(target=watch_data, args=(watcher,), name="clean-data-watcher", daemon=True).start()
+    return watcher
 
 #title
 st.title("NCS Hope Foundation Dashboard")
 
 # sidebar for navigation
-page = st.sidebar.radio("Select a Page", ["Home Page", "Applications Ready for Review", "Support Breakdown by Demographics", "Support Response Time", "Grant Utilization Overview", "Impact & Progress Summary"])
+page = st.sidebar.radio("Select a Page", list(page_columns))
+
+version = data_watcher()['version']
+
+# generic filters for every page, leaving a filter empty (or a range at its full width) means it isnt applied
+choices = filter_choices(version)
+filters = []
+with st.sidebar.expander("Filters"):
+    for label, column in filter_options.items():
+        chosen = st.multiselect(label, sorted(choices['values'][column], key=str))
+        if chosen:
+            filters.append(('in', column, tuple(chosen)))
+    for label, column in range_filter_options.items():
+        low, high = choices['ranges'][column]
+        if low is None or low == high:
+            continue
+        low, high = float(low), float(high)
+        chosen = st.slider(label, low, high, (low, high))
+        if chosen != (low, high):
+            filters.append(('range', column) + chosen)
+filters = tuple(filters)
+
+# with the database nothing is loaded up front, every page asks it for what it shows
+if sqlite_file(version) is None:
+    load_start = time.perf_counter()
+    columns = page_columns[page]
+    stdf = load_clean_data(version, tuple(columns) if columns is not None else None)
+    print(f"Loaded {len(stdf)} rows for '{page}' in {time.perf_counter() - load_start:.3f}s ({'cache miss' if cache_misses else 'cache hit'})")
 
 #Home page
 if page == "Home Page":
@@ -54,85 +579,64 @@ if page == "Home Page":
 # Applications ready for review page
 elif page == "Applications Ready for Review":
     st.header("Applications Ready for Review")
-    
-    ready_for_review = stdf[stdf['request_status'] == 'Pending']
-
-    # handle NA values in 'application_signed' and replace them with 'missing'
-    ready_for_review['application_signed'] = ready_for_review['application_signed'].fillna('Missing')
 
     # dropdown for filtering based on committee signature status
-    signature_status = st.selectbox("Select Committee Signature Status", ['All', 'Signed', 'Not Signed', 'Unsure'])
-
+    signature_status = st.selectbox("Select Committee Signature Status", ['All'] + list(signature_values))
+    sort_order = st.radio("Sort by Grant Request Date", ['Newest First', 'Oldest First'], horizontal=True)
+    available_columns = choices['columns'] if sqlite_file(version) else list(stdf.columns)
+    shown_columns = st.multiselect("Columns to Show", available_columns,
+                                   default=[c for c in review_columns if c in available_columns])
+    page_size = st.selectbox("Applications per Page", [25, 50, 100, 250], index=1)
+
+    # pending applications that pass the sidebar filters (and the signature status), in grant date order
+    ready = filters + (('in', 'request_status', ('Pending',)),)
     if signature_status != 'All':
-        if signature_status == 'Signed':
-            ready_for_review = ready_for_review[ready_for_review['application_signed'] == 'Yes']
-        elif signature_status == 'Not Signed':
-            ready_for_review = ready_for_review[ready_for_review['application_signed'] == 'No']
-        elif signature_status == 'Unsure':
-            ready_for_review = ready_for_review[ready_for_review['application_signed'] == 'Missing']
+        ready += (('in', 'application_signed', (signature_values[signature_status],)),)
+
+    if sqlite_file(version):
+        application_count = sql_query(version, "COUNT(*) AS count", ready)['count'][0]
+    else:
+        filter_index = load_filter_index(version)
+        positions = grant_date_order(version)[sort_order]
+        positions = positions[bitmap_mask(filter_index, apply_filters(filter_index, ready))[positions]]
+        application_count = len(positions)
+
+    # only the rows of the current page ever get copied out of the cached frame (or the database)
+    page_count = max(1, -(-application_count // page_size))
+    page_number = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, value=1, step=1)
+    start = (page_number - 1) * page_size
+
+    if sqlite_file(version):
+        # ties keep the order the rows were loaded in, same as the stable sort in grant_date_order
+        direction = 'DESC' if sort_order == 'Newest First' else 'ASC'
+        ready_for_review = sql_query(version, ", ".join(['rowid'] + [f'"{c}"' for c in shown_columns]), ready, (),
+                                     f"ORDER BY grant_req_date {direction} NULLS LAST, rowid LIMIT ? OFFSET ?", (page_size, start)).set_index('rowid').rename_axis(None)
+    else:
+        ready_for_review = stdf.iloc[positions[start:start + page_size]][shown_columns]
 
     # display the filtered applications
     st.write(f"Displaying applications with signature status '{signature_status}'")
+    st.caption(f"Showing {start + 1 if len(ready_for_review) else 0}-{start + len(ready_for_review)} of {application_count} applications")
+
+    # handle NA values in 'application_signed' and replace them with 'missing'
+    if 'application_signed' in ready_for_review.columns:
+        ready_for_review['application_signed'] = ready_for_review['application_signed'].astype(object).fillna('Missing')
     st.dataframe(ready_for_review)
 
 # Support Breakdown by Demographic Page
 elif page == "Support Breakdown by Demographics":
     st.header("Support Breakdown by Demographics")
-    demographics = [
-        'Gender', 'Location', 'Zip Code', 'Language Spoken', 'Hispanic or Latino', 
-        'Sexuality', 'Race', 'Insurance Type', 'Total Household Gross Monthly Income', 'Marital Status', 'Household Size', 'Age'
-    ]
 
     # select which demographic to filter by
-    demographic_choice = st.selectbox("Select Demographic", demographics)
-
-    # filter & display data based on the selected demographic
-    if demographic_choice == "Gender":
-        # sum support by amount and _____ (in this case gender)
-        st.header("Support Breakdown by Gender")
-        gender_support = stdf.groupby("gender")["amount"].sum()  
-        st.write(gender_support)
-        st.bar_chart(gender_support)
-
-    elif demographic_choice == "Insurance Type":
-        st.header("Support Breakdown by Patient's Insurance Type")
-        insurance_support = stdf.groupby("insurance_type")["amount"].sum()  
-        st.write(insurance_support)
-        st.bar_chart(insurance_support)
-
-    elif demographic_choice == "Sexuality":
-        st.header("Support Breakdown by Sexuality")
-        sexuality_support = stdf.groupby("sexual_orientation")["amount"].sum()  
-        st.write(sexuality_support)
-        st.bar_chart(sexuality_support)
-
-    elif demographic_choice == "Race":
-        st.header("Support Breakdown by Race")
-        racial_support = stdf.groupby("race")["amount"].sum()  
-        st.write(racial_support)
-        st.bar_chart(racial_support)
-
-    elif demographic_choice == "Language Spoken":
-        st.header("Support Breakdown by Language Spoken")
-        language_support = stdf.groupby("language")["amount"].sum()  
-        st.write(language_support)
-        st.bar_chart(language_support)
-
-    elif demographic_choice == "Hispanic or Latino":
-        st.header("Support Breakdown by Ethnicity (Hispanic or Latino)")
-        ethnicity_support = stdf.groupby("hispaniclatino")["amount"].sum()  
-        st.write(ethnicity_support)
-        st.bar_chart(ethnicity_support)
-
-    elif demographic_choice == 'Location':
-        st.header("Support Breakdown by State")
-        state_support = stdf.groupby("pt_state")["amount"].sum()
-        st.write(state_support)
-        st.bar_chart(state_support)
-
-    elif demographic_choice == "Total Household Gross Monthly Income":
-        st.header("Support Breakdown by Total Household Gross Monthly Income")
+    demographic_choice = st.selectbox("Select Demographic", list(demographic_options))
+    demographic_column, demographic_title = demographic_options[demographic_choice]
 
+    # optional second demographic to split each bar by (e.g. race x income), served from the same cube
+    breakdown_choice = st.selectbox("Break Down Further By", ["None"] + [d for d in demographic_options if d != demographic_choice])
+
+    st.header(demographic_title)
+
+    if demographic_choice == "Total Household Gross Monthly Income":
         # legend/Explanation
         st.markdown("""
             **Legend for Household Income:**
@@ -144,36 +648,40 @@ elif page == "Support Breakdown by Demographics":
             This breakdown helps to analyze how support is distributed across different income levels.
         """)
 
-        income_support = stdf.groupby("total_household_gross_monthly_income")["amount"].sum()
-        st.write(income_support)
-        st.bar_chart(income_support)
-
-    elif demographic_choice == "Zip Code":
-        st.header("Support Breakdown by Zip Code")
-
-        zip_code_support = stdf.groupby("pt_zip")["amount"].sum()
-        st.write(zip_code_support)
-
-        map_data = stdf[['lat', 'lng', 'amount', 'pt_zip']] 
+    elif demographic_choice == "Age":
+        st.markdown("""
+            **Legend for Age Categories:**
+        
+            - Child: 0-19
+            - Young Adult: 20-35
+            - Adult: 36-65
+            - Senior: 66+
+        """)
 
-        # clean lat/lng to remove invalid values
-        map_data["lat"] = pd.to_numeric(map_data["lat"], errors="coerce")
-        map_data["lng"] = pd.to_numeric(map_data["lng"], errors="coerce")
-        map_data = map_data.dropna(subset=["lat", "lng"])
+    # sum of support, number of grants and distinct patients for the selected demographic(s), from the cube or the database
+    if breakdown_choice == "None":
+        support = demographic_support(version, filters, demographic_column)
+        chart_data = support["amount"]
+    else:
+        support = demographic_support(version, filters, demographic_column, demographic_options[breakdown_choice][0])
+        chart_data = support["amount"].unstack()
 
+    # ensure the age chart shows categories in logical order
+    if demographic_choice == "Age":
+        chart_data = chart_data.reindex(age_order)
 
-        # drop rows without coordinates or amount
-        map_data = map_data.dropna(subset=["lat", "lng", "amount"])
+    st.write(support)
+    st.bar_chart(chart_data)
 
-        map_data["lat"] = map_data["lat"].astype(float)
-        map_data["lng"] = map_data["lng"].astype(float)
-        map_data["amount"] = map_data["amount"].astype(float)
+    if demographic_choice == "Zip Code":
+        map_data = zip_map_summary(version, filters)
 
         # create a pydeck map (full disclosure: i used chatgpt for assistance bc this was completely new and i know you had a great option for this but I already had begun working with this so i decided to just to commit to it)
         deck = pdk.Deck(
             initial_view_state=pdk.ViewState(
-                latitude=map_data['lat'].mean(),
-                longitude=map_data['lng'].mean(),
+                # centered on the grants, same as before the zips were aggregated
+                latitude=(map_data['lat'] * map_data['grants']).sum() / map_data['grants'].sum(),
+                longitude=(map_data['lng'] * map_data['grants']).sum() / map_data['grants'].sum(),
                 zoom=7,  #trying 7, 10 was way too close
             ),
             layers=[
@@ -181,61 +689,29 @@ elif page == "Support Breakdown by Demographics":
                     'ScatterplotLayer',
                     map_data,
                     get_position='[lng, lat]',
-                    get_radius=1000,
+                    get_radius='radius',
                     get_fill_color=[255, 0, 0, 140],
                     pickable=True,
                 )
-            ]
+            ],
+            tooltip={"text": "Zip {pt_zip}\n{amount_label} over {grants} grants\n{patients} patients"},
         )
 
         st.pydeck_chart(deck)
 
 
-    elif demographic_choice == "Marital Status":
-        st.header("Support Breakdown by Marital Status")
-        marriage_support = stdf.groupby('marital_status')['amount'].sum()
-        st.write(marriage_support)
-        st.bar_chart(marriage_support)
-
-    elif demographic_choice == "Household Size":
-        st.header("Support Breakdown by Household Size")
-        householdsize_support = stdf.groupby('household_size')['amount'].sum()
-        st.write(householdsize_support) 
-        st.bar_chart(householdsize_support)
-
-    elif demographic_choice == "Age":
-        st.header("Support Breakdown by Age")
-        st.markdown("""
-            **Legend for Age Categories:**
-        
-            - Child: 0-19
-            - Young Adult: 20-35
-            - Adult: 36-65
-            - Senior: 66+
-        """)
-
-        # define order for the categories
-        age_order = ["Child", "Young Adult", "Adult", "Senior"]
-
-        # group by age_category and calculate the sum of the amounts
-        age_support = stdf.groupby('age_category')['amount'].sum()
-
-        # ensure the chart shows categories in logical order
-        age_support = age_support.reindex(age_order)
-        st.write(age_support)
-        st.bar_chart(age_support)
-    
-
 elif page == "Support Response Time":
     st.header("Support Response Time")
 
+    summary = response_time_summary(version, filters)
+
     # summary statistics
     st.subheader("Summary Statistics")
-    st.write(stdf['days_to_support'].dropna().describe())
+    st.write(summary['describe'])
 
     # histogram of response times
     st.subheader("Distribution of Response Times (in Days)")
-    st.bar_chart(stdf['days_to_support'].value_counts().sort_index())
+    st.bar_chart(summary['counts'])
 
     
 
@@ -243,22 +719,13 @@ elif page == "Support Response Time":
 elif page == "Grant Utilization Overview":
     st.header("Grant Utilization Overview")
 
-    # filter patients with a positive remaining balance
-    positive_balance = stdf[stdf['remaining_balance'] > 0]
+    summary = grant_utilization_summary(version, filters)
 
     # count how many patients have a positive remaining balance
-    patients_with_positive_balance = positive_balance['patient_id'].nunique()
-
-    st.subheader(f"Number of Patients with Positive Balance: {patients_with_positive_balance}")
-
-    # binning the remaining_balance into categories by 300 increments
-    bin_labels = ['0-300', '301-600', '601-900', '901-1200', '1201-1500', '1501+']
-    bins = [0, 300, 600, 900, 1200, 1500, float('inf')]
-
-    positive_balance['balance_bins'] = pd.cut(positive_balance['remaining_balance'], bins=bins, labels=bin_labels)
+    st.subheader(f"Number of Patients with Positive Balance: {summary['patients_with_positive_balance']}")
 
     st.subheader("Distribution of Remaining Balances (Binned)")
-    st.bar_chart(positive_balance['balance_bins'].value_counts().sort_index(), use_container_width=True)
+    st.bar_chart(summary['balance_bins'], use_container_width=True)
 
 
     # *** Grants by Assistance Type *** (same page)
@@ -266,72 +733,59 @@ elif page == "Grant Utilization Overview":
     st.subheader("Grant Distribution by Assistance Type")
 
     # count number of grants by assistance type
-    assistance_type_counts = stdf['assistance_type'].value_counts()
+    assistance_type_counts = summary['assistance_type_counts']
 
 
     st.write(assistance_type_counts)
-# created the plot using streamlit pie chart option
-    fig = assistance_type_counts.plot(kind='pie', autopct='%1.1f%%', figsize=(8, 8), ylabel='', title='Grants by Assistance Type'
-    ).get_figure()
-    st.pyplot(fig)
+# created the plot using streamlit pie chart option (drawn once per version and filters, see assistance_type_pie)
+    pie = assistance_type_pie(version, filters)
+    if pie is not None:
+        st.image(pie, use_container_width=True)
 
     st.subheader("Support by Assistance Type")
-    assistance_support= stdf.groupby("assistance_type")["amount"].sum()
-    st.write(assistance_support)
+    st.write(summary['assistance_support'])
     
 
  # Impact & Progress Summary 
 elif page == "Impact & Progress Summary":
-    st.header("Impact & Progress Summary (All Time)")
-
-    summary_data = stdf.copy()
-    summary_data['grant_req_date'] = pd.to_datetime(summary_data['grant_req_date'], errors='coerce')
+    st.header("Impact & Progress Summary")
 
-    st.subheader("Key Metrics")
+    # all time, or any year / month there were requests in (newest first)
+    months = request_trend(version, ()).query("granularity == 'Monthly'")['period'].str[:7].tolist()[::-1]
+    years = sorted({month[:4] for month in months}, reverse=True)
+    period = st.selectbox("Key Metrics For", [None] + years + months, format_func=period_label)
 
-    approved_grants = summary_data[summary_data['request_status'] == "Approved"]
+    summary = impact_summary(version, filters, period)
 
-    total_grants = approved_grants['amount'].sum()
-    total_patients = approved_grants['patient_id'].nunique()
-    total_approved = len(approved_grants)
-
-    total_remaining = approved_grants[approved_grants['remaining_balance'] > 0]['remaining_balance'].sum()
-    overspent = abs(approved_grants[approved_grants['remaining_balance'] < 0]['remaining_balance'].sum())
-
-    returning_patients = approved_grants['patient_id'].value_counts()
-    num_returning_patients = (returning_patients > 1).sum()
-
-    # calculate average days to support
-    avg_days = summary_data['days_to_support'].mean() if 'days_to_support' in summary_data.columns else None
+    st.subheader(f"Key Metrics ({period_label(period)})")
 
     # row 1
     col1, col2, col3 = st.columns(3)
-    col1.metric("Total Grant Amount Awarded", f"${total_grants:,.2f}")
-    col2.metric("Total Overspent Amount", f"${overspent:,.2f}")
-    col3.metric("Total Approved Grants", len(approved_grants))
+    col1.metric("Total Grant Amount Awarded", f"${summary['total_grants']:,.2f}")
+    col2.metric("Total Overspent Amount", f"${summary['overspent']:,.2f}")
+    col3.metric("Total Approved Grants", summary['total_approved'])
 
     # row 2
     col4, col5, col6 = st.columns(3)
-    col4.metric("Unique Patients Served", total_patients)
-    col5.metric("Returning Patients Supported", num_returning_patients)
-    if avg_days is not None:
-        col6.metric("Avg. Days to Support", f"{avg_days:.1f} days")
+    col4.metric("Unique Patients Served", summary['total_patients'])
+    col5.metric("Returning Patients Supported", summary['num_returning_patients'])
+    if pd.notna(summary['avg_days']):
+        col6.metric("Avg. Days to Support", f"{summary['avg_days']:.1f} days")
     else:
         col6.metric("Avg. Days to Support", "N/A")
 
     # grant trend chart
     st.subheader("Grant Request Trend Over Time")
-    if 'grant_req_date' in summary_data.columns:
-        summary_data['grant_month'] = summary_data['grant_req_date'].dt.to_period('M')
-        monthly_requests = summary_data.dropna(subset=['grant_month']).groupby('grant_month').size()
-        monthly_requests.index = monthly_requests.index.to_timestamp()
-        monthly_requests.index.name = 'Time' # removes 'grant_month' label from x-axis
-
-        fig = px.line(
-            monthly_requests,
-            x=monthly_requests.index,
-            y=monthly_requests.values,
-            labels={'x': 'Month', 'y': 'Number of Requests'},
-            title='Monthly Grant Requests Over Time'
-        )
+    trend = request_trend(version, filters)
+    days = pd.to_datetime(trend.loc[trend['granularity'] == 'Daily', 'period'])
+    if len(days):
+        col7, col8 = st.columns(2)
+        granularity = col7.radio("Group By", list(granularities), index=2, horizontal=True)
+        measure = col8.selectbox("Show", list(trend_measures))
+        first, last = days.iloc[0].date(), days.iloc[-1].date()
+        chosen = st.date_input("Grant Request Dates", (first, last), min_value=first, max_value=last)
+        # while only the start of the range has been picked, show everything after it
+        start, end = (chosen[0], chosen[1]) if len(chosen) == 2 else (chosen[0] if chosen else first, last)
+
+        fig = request_trend_figure(version, filters, granularity, measure, start, end)
         st.plotly_chart(fig, use_container_width=True)
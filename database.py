@@ -0,0 +1,107 @@
+import os
+import sqlite3
+
+import pandas as pd
+
+# sqlite copy of the cleaned data
+# datacleaning.py --sqlite appends every cleaned file into one table (rows are tagged with the file they came from, so
+# cleaning the same file again replaces its rows instead of adding them twice). the dashboard then asks the database
+# for the counts and sums each page needs instead of loading every cleaned file into pandas, so a session only ever
+# holds the small results and an interaction is an indexed query.
+
+database_file = "clean_data.db"
+table_name = "grants"
+rollup_table = "rollups"
+
+# columns the dashboard filters and groups on
+index_columns = [
+    'request_status', 'grant_req_date', 'patient_id', 'gender', 'pt_state', 'pt_zip', 'language', 'hispaniclatino',
+    'sexual_orientation', 'race', 'insurance_type', 'total_household_gross_monthly_income', 'marital_status',
+    'household_size', 'age_category']
+rollup_index_columns = ['granularity', 'period']
+
+
+# rows should already be typed (datacleaning.to_typed_frame), dates are stored as YYYY-MM-DD text so they still sort
+def store_rows(rows, db_file, source_file, table=table_name, indexes=index_columns):
+    rows = rows.copy()
+    for column in rows.columns:
+        if pd.api.types.is_datetime64_any_dtype(rows[column]):
+            rows[column] = rows[column].dt.strftime('%Y-%m-%d')
+        elif isinstance(rows[column].dtype, pd.CategoricalDtype):
+            rows[column] = rows[column].astype(object)
+    source = os.path.basename(source_file)
+    rows.insert(0, 'source_file', source)
+
+    connection = sqlite3.connect(db_file)
+    try:
+        with connection:
+            existing = table_columns(connection, table)
+            if existing:
+                connection.execute(f"DELETE FROM {table} WHERE source_file = ?", (source,))
+                # a newer export can have columns the table doesnt have yet
+                for column in rows.columns:
+                    if column not in existing:
+                        connection.execute(f'ALTER TABLE {table} ADD COLUMN "{column}"')
+            rows.to_sql(table, connection, if_exists='append', index=False)
+            for column in ['source_file'] + indexes:
+                if column in rows.columns:
+                    connection.execute(f'CREATE INDEX IF NOT EXISTS "{table}_{column}" ON {table} ("{column}")')
+    finally:
+        connection.close()
+
+
+def table_columns(connection, table=table_name):
+    return [row[1] for row in connection.execute(f"PRAGMA table_info({table})")]
+
+
+# read only, so a dashboard session can never change the data
+def connect(db_file):
+    return sqlite3.connect(f"file:{db_file}?mode=ro", uri=True)
+
+
+def query(db_file, sql, params=()):
+    connection = connect(db_file)
+    try:
+        return pd.read_sql_query(sql, connection, params=list(params))
+    finally:
+        connection.close()
+
+
+# plain python values, for when pandas would turn a column of ints with a NULL into floats
+def fetch(db_file, sql, params=()):
+    connection = connect(db_file)
+    try:
+        return connection.execute(sql, list(params)).fetchall()
+    finally:
+        connection.close()
+
+
+def columns(db_file):
+    connection = connect(db_file)
+    try:
+        return [column for column in table_columns(connection) if column != 'source_file']
+    finally:
+        connection.close()
+
+
+# sidebar filters (same ('in', column, values) / ('range', column, low, high) tuples as filters.py) as a sql condition,
+# 'Missing' matches empty values like it does in the filter index. extra conditions can be added to the list, with
+# the values for any ? in them in condition_params
+def where_clause(filters, conditions=(), condition_params=()):
+    clauses = list(conditions)
+    params = list(condition_params)
+    for kind, column, *arguments in filters:
+        if kind == 'in':
+            values = [value for value in arguments[0] if value != 'Missing']
+            options = []
+            if values:
+                options.append(f"{column} IN ({', '.join('?' * len(values))})")
+                params += values
+            if 'Missing' in arguments[0]:
+                options.append(f"{column} IS NULL")
+            clauses.append(f"({' OR '.join(options) or '0'})")
+        else:
+            low, high = arguments
+            clauses.append(f"{column} BETWEEN ? AND ?")
+            params += [low, high]
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
@@ -1,8 +1,37 @@
 import pandas as pd
+import numpy as np
 import re
-from datetime import date
-import sys
+from datetime import date, datetime
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import io
+import json
 import os
+import time
+import tracemalloc
+import warnings
+
+import openpyxl
+from openpyxl.cell.cell import ERROR_CODES
+from pandas.io.parsers import TextParser
+
+from rules import compile_rules, match_rule, matching_rules, classify_column, classify_all_column, rule_report
+import database
+from rollups import rollup_path, build_rollups, update_rollups
+from metrics import metrics_path, build_store, add_rows, load_store, save_store
+
+# helpers shared by the per-cell and the whole-column cleaners
+# keep only the cells that are actual strings (everything else becomes nan) so the .str accessor is safe on any column
+def string_cells(series):
+    series = series.astype(object)
+    return series.where(series.map(type).eq(str))
+
+
+# same as str(value) for every cell
+def text_cells(series):
+    return series.astype(object).astype(str)
+
 
 # cleaning each column, starting with patient id number
 def clean_patient_id(patient_id):
@@ -66,15 +95,12 @@ def clean_payment_status(value):
 
 
 # additional category: calculate days to support
-def calculate_days_to_support(row):
-    support_date = row['payment_submitted']
-    request_date = row['grant_req_date']
-
-    if isinstance(support_date, str):
-        return None
-    if pd.isna(support_date) or pd.isna(request_date):
-        return None
-    return (support_date - request_date).days
+# works on the whole cleaned columns at once. payment_submitted is a date, 'Yes'/'No' or 'NA', only real dates count
+def calculate_days_to_support(payment_submitted, grant_req_date):
+    support_date = pd.to_datetime(payment_submitted.where(payment_submitted.map(type).ne(str)), errors='coerce')
+    request_date = pd.to_datetime(grant_req_date, errors='coerce')
+    # always float, so it comes out the same whether or not this batch of rows happens to have a missing value
+    return (support_date - request_date).dt.days.astype(float)
 
 
 # reason pending
@@ -146,27 +172,43 @@ def clean_state(state):
 
 
 # zip code cleaning
-zip_df = pd.read_csv("uszips.csv", dtype={"zip": str})
-zip_df['zip'] = zip_df['zip'].astype(str)
+# uszips.csv is only read the first time coordinates are actually needed (so importing this file stays cheap), and
+# is kept as a sorted array of 5 digit zips next to a matching array of lat/lng, so a whole column of zips can be
+# resolved with one np.searchsorted instead of a dict lookup + pd.Series per row
+zip_file = "uszips.csv"
+zip_index = None
 
-# create a dictionary
-zip_dict = dict(zip(zip_df['zip'], zip_df[['lat', 'lng']].values))
+def load_zip_index():
+    global zip_index
+    if zip_index is None:
+        zip_df = pd.read_csv(zip_file, dtype={"zip": str}, usecols=["zip", "lat", "lng"])
+        zip_df["zip"] = normalize_zip(zip_df["zip"])
+        zip_df = zip_df.dropna(subset=["zip"]).drop_duplicates("zip").sort_values("zip")
+        zip_index = (zip_df["zip"].to_numpy(dtype="int32"), zip_df[["lat", "lng"]].to_numpy(dtype="float64"))
+    return zip_index
 
-# get lat and lng from og dataset
-def get_lat_lng(zip_code):
-    if pd.isna(zip_code):
-        return None, None
-    
-    # look up lat and lng directly from zip_dict
-    if zip_code in zip_dict:
-        return zip_dict[zip_code]
-    else:
-        return None, None
 
-# function to apply get_lat_lng to the dataframe
-def apply_lat_lng(row):
-    lat, lng = get_lat_lng(row['pt_zip'])
-    return pd.Series([lat, lng], index=['lat', 'lng'])
+# turn whatever is in the zip column into a 5 digit zip number (or nan): ZIP+4 ('68507-1139' or '685071139')
+# keeps the first 5 digits, and zips that lost their leading zero in excel ('2134' or 2134.0) get it back
+def normalize_zip(zip_codes):
+    text = text_cells(zip_codes).str.strip().str.replace(r'\.0$', '', regex=True)
+    parts = text.str.extract(r'^(\d{5})-?\d{4}$|^(\d{3,5})$')
+    return pd.to_numeric(parts[0].where(parts[0].notna(), parts[1].str.zfill(5)), errors='coerce')
+
+
+# lat and lng for a whole column of zips in one go, nan where the zip isnt in uszips.csv
+def lookup_lat_lng(zip_codes):
+    zips, coords = load_zip_index()
+    wanted = normalize_zip(zip_codes).to_numpy(dtype=float)
+
+    found = np.zeros(len(wanted), dtype=bool)
+    lat_lng = np.full((len(wanted), 2), np.nan)
+    if len(zips):
+        position = np.searchsorted(zips, np.nan_to_num(wanted, nan=-1)).clip(max=len(zips) - 1)
+        found = zips[position] == wanted
+        lat_lng[found] = coords[position[found]]
+
+    return pd.DataFrame(lat_lng, columns=['lat', 'lng'], index=zip_codes.index)
 
 
 # language column 
@@ -212,12 +254,13 @@ def clean_dob(value):
 
 
 # add age column based on cleaned dob
-def add_age_column(dob_column):
-    today = date.today()
-    return dob_column.apply(
-        lambda d: today.year - d.year - ((today.month, today.day) < (d.month, d.day))
-        if pd.notna(d) else pd.NA
-    ).astype('Int64')
+# ages are as of reference_date (today if not given), pass a fixed date to get the same ages on every run
+def add_age_column(dob_column, reference_date=None):
+    today = reference_date or date.today()
+    dob = pd.to_datetime(dob_column, errors='coerce')
+    # one year less if their birthday hasnt come around yet this year
+    before_birthday = (dob.dt.month > today.month) | ((dob.dt.month == today.month) & (dob.dt.day > today.day))
+    return (today.year - dob.dt.year - before_birthday).astype('Int64')
 
 
 #categorizing ages for easier visualization of distributions later on, not totally necessary
@@ -247,21 +290,19 @@ def add_age_category_column(age_column):
 
 
 #cleaning marriage columm 
+marriage_patterns = {
+    'Divorced': r'(divorced|separated|dissolved)',
+    'Married': r'(married|husband|wife|spouse)',
+    'Domestic Partnership': r'(domestic partnership|partner|civil union)',
+    'Single/Widowed': r'(single|widowed|never married)'}
+
+marriage_rules = compile_rules(marriage_patterns, re.IGNORECASE, prepare=text_cells)
+
 def clean_marriage_status(status):
-    marriage_patterns = {
-        'Divorced': r'(?i)(divorced|separated|dissolved)',
-        'Married': r'(?i)(married|husband|wife|spouse)',
-        'Domestic Partnership': r'(?i)(domestic partnership|partner|civil union)',
-        'Single/Widowed': r'(?i)(single|widowed|never married)'}
-    
     if pd.isnull(status) or status == "":
         return 'NA'
-    
-    for category, pattern in marriage_patterns.items():
-        if re.search(pattern, str(status)):
-            return category
 
-    return 'NA'
+    return match_rule(marriage_rules, str(status)) or 'NA'
 
 
 # cleaning gender 
@@ -288,37 +329,31 @@ def clean_gender(gender):
 
 
 # race cleaning
+# standardize race groups, again, want to be inclusive for future entries
+race_patterns = {
+    'Native American or Alaska Native': r'american indian|alaska native|native american',
+    'Asian': r'asian|chinese|japanese|korean',
+    'Black or African American': r'black|african american|african',
+    'White': r'white|whiate|caucasian|european|european american',  # Fix misspelling 'whiate'
+    'Two or More Races': r'two or more races|multiracial|mixed|biracial',
+    'Middle Eastern or North African': r'middle eastern|north african|arab|mena',
+    'Pacific Islander': r'pacific islander|polynesian|micronesian|melanesian|native hawaiian|hawaiian',
+    'Jewish': r'jewish|jew',
+    'Romani': r'romani|gypsy',
+    'Afro-Caribbean': r'afro-caribbean|caribbean',
+    'South Asian': r'south asian|indian|pakistani|bangladeshi|sri lankan'}
+
+def race_text(series):
+    return string_cells(series).str.strip().str.lower()
+
+race_rules = compile_rules(race_patterns, prepare=race_text)
+
 def clean_race(race):
     if pd.isna(race) or race.strip().lower() in ['missing', 'decline to answer', '']:
         return 'NA'
     
     race = race.strip().lower()
-
-    # standardize race groups, again, want to be inclusive for future entries
-    if re.search(r'american indian|alaska native|native american', race):
-        return 'Native American or Alaska Native'
-    elif re.search(r'asian|chinese|japanese|korean', race):
-        return 'Asian'
-    elif re.search(r'black|african american|african', race):
-        return 'Black or African American'
-    elif re.search(r'white|whiate|caucasian|european|european american', race):  # Fix misspelling 'whiate'
-        return 'White'
-    elif re.search(r'two or more races|multiracial|mixed|biracial', race):
-        return 'Two or More Races'
-    elif re.search(r'middle eastern|north african|arab|mena', race):
-        return 'Middle Eastern or North African'
-    elif re.search(r'pacific islander|polynesian|micronesian|melanesian|native hawaiian|hawaiian', race):
-        return 'Pacific Islander'
-    elif re.search(r'jewish|jew', race):
-        return 'Jewish'
-    elif re.search(r'romani|gypsy', race):
-        return 'Romani'
-    elif re.search(r'afro-caribbean|caribbean', race):
-        return 'Afro-Caribbean'
-    elif re.search(r'south asian|indian|pakistani|bangladeshi|sri lankan', race):
-        return 'South Asian'
-    else:
-        return 'Other'
+    return match_rule(race_rules, race) or 'Other'
 
 
 
@@ -350,43 +385,39 @@ def clean_hispanic_latino(value):
 
 
 # cleaning sex
-def clean_sexual_orientation(value):
-    value_str = str(value).lower().strip()
-    
-    if re.match(r'^(missing|n/a|decline to answer|male|female)$', value_str):
-        return 'NA'
-    
+sexual_orientation_patterns = {
+    'NA': r'^(missing|n/a|decline to answer|male|female)$',
     # check for heterosexual/straight
-    if re.search(r'(straight|heterosexual)', value_str):
-        return 'Heterosexual'
-    
+    'Heterosexual': r'(straight|heterosexual)',
     # gay/lesbian
-    if re.search(r'(gay|lesbian|homosexual|queer)', value_str):
-        return 'Homosexual'
-    
+    'Homosexual': r'(gay|lesbian|homosexual|queer)',
     # bisexual
-    if re.search(r'bisexual', value_str):
-        return 'Bisexual'
-    
-    return 'NA'
+    'Bisexual': r'bisexual'}
+
+def sexual_orientation_text(series):
+    return text_cells(series).str.lower().str.strip()
+
+sexual_orientation_rules = compile_rules(sexual_orientation_patterns, prepare=sexual_orientation_text)
+
+def clean_sexual_orientation(value):
+    value_str = str(value).lower().strip()
+    return match_rule(sexual_orientation_rules, value_str) or 'NA'
 
 
 
 #cleaning insurance type, categorizing for dashboard simplicity in visualization
+insurance_patterns = {
+    'Public Insurance': r'(medicare.*(medicaid|other))',
+    'Military Insurance': r'military',
+    'Private Insurance': r'(private)',
+    'Uninsured': r'(uninsured|unisurred|unisured|missing|^$)',
+    'NA': r'(unknown)'
+}
+
+insurance_rules = compile_rules(insurance_patterns, re.IGNORECASE, prepare=text_cells)
+
 def clean_insurance_type(insurance):
-    insurance_patterns = {
-        'Public Insurance': r'(?i)(medicare.*(medicaid|other))',
-        'Military Insurance': r'(?i)military',
-        'Private Insurance': r'(?i)(private)',
-        'Uninsured': r'(?i)(uninsured|unisurred|unisured|missing|^$)',
-        'NA': r'(?i)(unknown)'
-    }
-    
-    for category, pattern in insurance_patterns.items():
-        if re.search(pattern, str(insurance)):
-            return category
-    
-    return 'NA'
+    return match_rule(insurance_rules, str(insurance)) or 'NA'
 
 
 # cleaning household size 
@@ -462,25 +493,26 @@ def clean_distance(distance):
 
 
 # cleaning referral source, categorizing w regex
-def classify_referral_source(referral):
-    source_patterns = {
-        'Pediatric Hospitals': r'(children|pediatric)',
-        'Cancer Centers': r'(cancer|oncology|hematology|nebraska cancer|morrison cancer|june e nylen|heartland oncology|ncs|cpn|mcc|meccspecialists|nebraska hematology|heartland hematology|nho)',
-        'Hospital Networks': r'(health|hospital|medical center|clinic|community|practice|mje|st|medical|nemed)',
-        'Other': r'.*'
-    }
+source_patterns = {
+    'Pediatric Hospitals': r'(children|pediatric)',
+    'Cancer Centers': r'(cancer|oncology|hematology|nebraska cancer|morrison cancer|june e nylen|heartland oncology|ncs|cpn|mcc|meccspecialists|nebraska hematology|heartland hematology|nho)',
+    'Hospital Networks': r'(health|hospital|medical center|clinic|community|practice|mje|st|medical|nemed)',
+    'Other': r'.*'
+}
+
+def referral_text(series):
+    return text_cells(series).str.strip().str.lower().str.replace(r'\s+', ' ', regex=True)
+
+referral_rules = compile_rules(source_patterns, re.IGNORECASE, prepare=referral_text)
 
+def classify_referral_source(referral):
     referral = str(referral).strip().lower()
     referral = re.sub(r'\s+', ' ', referral)
 
     if referral == '' or referral == 'missing':
         return 'NA'
 
-    for category, pattern in source_patterns.items():
-        if re.search(pattern, referral, flags=re.IGNORECASE):
-            return category
-
-    return 'Unknown'
+    return match_rule(referral_rules, referral) or 'Unknown'
 
 
 
@@ -513,6 +545,11 @@ assistance_patterns = {
     'Multiple': r','  # treat comma-separated entries as multiple
 }
 
+def assistance_text(series):
+    return text_cells(series).str.strip().str.lower()
+
+assistance_rules = compile_rules(assistance_patterns, prepare=assistance_text)
+
 # classification function of assistance type
 def classify_assistance_type(text):
     if pd.isna(text) or str(text).strip().lower() in ['na', 'missing', '', 'n/a']:
@@ -523,7 +560,7 @@ def classify_assistance_type(text):
     if text == 'multiple':
         return 'Multiple'
     
-    matches = [category for category, pattern in assistance_patterns.items() if re.search(pattern, text)]
+    matches = matching_rules(assistance_rules, text)
     
     if len(matches) > 1:
         return 'Multiple'
@@ -653,13 +690,558 @@ def clean_notes(value):
     return value  # leave non-empty values as is (not much i can do for this column other than this)
     
 
-def clean_data(input_file, sheet_name=None):
+# *** vectorized cleaners ***
+# same rules as the per-cell functions above, but written against the whole column with pandas string methods,
+# np.select and masked numeric conversion so we dont pay a python function call for every cell.
+# each one has to give the exact same output as its per-cell version (see check_engine below)
+
+number_types = [int, float, bool, np.int64, np.int32, np.float64, np.float32]
+nan_literals = ['nan', '+nan', '-nan']
+
+
+# masked version of float(value): returns the float values plus a mask of which cells float() would have accepted
+def as_float(series):
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return series.astype(float), pd.Series(True, index=series.index)
+
+    series = series.astype(object)
+    is_number = series.map(type).isin(number_types)
+    stripped = string_cells(series).str.strip()
+
+    values = pd.to_numeric(series.where(is_number), errors='coerce').astype(float)
+    parsed = pd.to_numeric(stripped, errors='coerce')
+    values = values.where(is_number, parsed)
+    ok = is_number | parsed.notna() | stripped.str.lower().isin(nan_literals)
+    return values, ok
+
+
+# masked version of int(value): floats get truncated, strings only count if they look like whole numbers
+def as_int(series):
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        values = np.trunc(series.astype(float))
+        return values, pd.Series(np.isfinite(values), index=series.index)
+
+    series = series.astype(object)
+    is_number = series.map(type).isin(number_types)
+    strings = string_cells(series)
+
+    values = np.trunc(pd.to_numeric(series.where(is_number), errors='coerce').astype(float))
+    whole = strings.str.fullmatch(r'\s*[+-]?\d+\s*', na=False)
+    values = values.where(is_number, pd.to_numeric(strings.where(whole).str.strip(), errors='coerce'))
+    ok = (is_number | whole) & pd.Series(np.isfinite(values), index=series.index)
+    return values, ok
+
+
+# same as re.search on every cell. the patterns are shared with the per-cell functions so they keep their groups,
+# which pandas warns about even though we only want true/false back
+def search(text, pattern):
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', UserWarning)
+        return text.str.contains(pattern, regex=True, na=False)
+
+
+# put the cleaned values back into a series the way .apply would (object column, then let pandas infer the dtype)
+def to_series(values, index):
+    return pd.Series(np.asarray(values, dtype=object), index=index).infer_objects()
+
+
+def clean_patient_id_vectorized(series):
+    missing = series.isna() | text_cells(series).str.strip().eq('')
+    return to_series(series.where(~missing, 'NA'), series.index)
+
+
+def clean_app_year_vectorized(series):
+    text = text_cells(series).str.strip()
+    years, ok = as_int(series)
+    valid = ~series.isna() & ~text.str.lower().eq('missing') & ~text.eq('') & ok & (years > 0)
+    out = np.full(len(series), 'NA', dtype=object)
+    out[valid.to_numpy()] = years[valid].astype('int64').to_numpy()
+    return to_series(out, series.index)
+
+
+# returns the three columns that clean_remaining_balance puts in its dict
+def clean_remaining_balance_vectorized(series):
+    values, ok = as_float(series)
+    missing = ok & values.isna()
+    valid = ok & values.notna()
+
+    over_balance = np.full(len(series), None, dtype=object)
+    over_balance[valid.to_numpy()] = (values[valid] < 0).to_numpy()
+
+    status = np.select(
+        [~ok, missing, values < 0],
+        ['Invalid entry', 'Missing value', 'Over balance'],
+        default='OK')
+
+    return pd.DataFrame({
+        'remaining_balance': values.where(valid),
+        'over_balance': to_series(over_balance, series.index),
+        'balance_status': status,
+    }, index=series.index)
+
+
+def clean_reason_pending_vectorized(series):
+    val = string_cells(series).str.lower()
+    conditions = [
+        search(val, 'hospice|deceased'),
+        search(val, 'over income|over limit|not eligible|no balance|not charged|request too high'),
+        search(val, 'pfa|follow up|waiting on payment'),
+        search(val, 'poi|ev|hs|missing|verify|needs|documentation'),
+    ]
+    choices = ['Hospice/Deceased', 'Ineligible', 'Follow-up', 'Missing Docs']
+    return pd.Series(np.select(conditions, choices, default='NA'), index=series.index)
+
+
+def clean_city_vectorized(series):
+    city = string_cells(series)
+    missing = series.isna() | city.eq('') | city.str.lower().eq('missing')
+    city = (
+        city.str.replace(r'[^a-zA-Z\s]', '', regex=True)
+        .str.replace(r'\s+', ' ', regex=True)
+        .str.strip()
+        .str.title()  # only letters and spaces are left at this point so title() is the same as capitalizing each word
+    )
+    return pd.Series(np.where(missing, 'NA', city), index=series.index)
+
+
+def clean_state_vectorized(series):
+    text = text_cells(series).str.strip()
+    missing = series.isna() | text.str.lower().eq('missing') | text.eq('')
+    upper = string_cells(series).str.upper()
+    conditions = [missing, upper.isin(list(state_abbreviation_map.values())), series.isin(list(state_abbreviation_map))]
+    choices = ['NA', upper, series.map(state_abbreviation_map)]
+    return pd.Series(np.select(conditions, choices, default='NA'), index=series.index)
+
+
+def clean_language_column_vectorized(series):
+    value = text_cells(series).str.lower()
+    missing = series.isna() | value.str.strip().isin(['na', 'n/a', '', 'missing', '?'])
+
+    # every language mentioned in each cell, so we can count how many different ones there are
+    found = value.str.extractall(lang_pattern)[0].str.title().groupby(level=0)
+    counts = found.nunique().reindex(series.index, fill_value=0)
+    single = found.first().reindex(series.index)
+
+    conditions = [missing, counts.eq(0), counts.eq(1)]
+    choices = ['NA', 'Unknown', single]
+    return pd.Series(np.select(conditions, choices, default='Bilingual'), index=series.index)
+
+
+def add_age_category_column_vectorized(age_column):
+    age = pd.to_numeric(age_column, errors='coerce').astype(float)
+    conditions = [age.isna() | (age < 0), age <= 19, age <= 35, age <= 65]
+    choices = ['NA', 'Child', 'Young Adult', 'Adult']
+    return pd.Series(np.select(conditions, choices, default='Senior'), index=age_column.index)
+
+
+def clean_marriage_status_vectorized(series):
+    missing = series.isnull() | series.eq('')
+    category = classify_column(marriage_rules, text_cells(series)).fillna('NA')
+    return pd.Series(np.where(missing, 'NA', category), index=series.index)
+
+
+# flip gender_patterns around so each spelling points at its category (first category wins like in the loop)
+gender_lookup = {}
+for category, terms in gender_patterns.items():
+    for term in terms:
+        gender_lookup.setdefault(term, category)
+
+def clean_gender_vectorized(series):
+    missing = series.isna() | series.isin(['', ' '])
+    gender = text_cells(series).str.lower().map(gender_lookup).fillna('NA')
+    return pd.Series(np.where(missing, 'NA', gender), index=series.index)
+
+
+def clean_race_vectorized(series):
+    race = race_text(series)
+    missing = series.isna() | race.isin(['missing', 'decline to answer', ''])
+    category = classify_column(race_rules, race).fillna('Other')
+    return pd.Series(np.where(missing, 'NA', category), index=series.index)
+
+
+def clean_hispanic_latino_vectorized(series):
+    value_str = text_cells(series).str.lower().str.strip()
+    conditions = [
+        series.isnull() | series.eq('') | value_str.isin(['blanks', 'missing']),
+        value_str.str.contains('non-hispanic', regex=False),
+        value_str.eq('no'),
+        search(value_str, 'hispanic|latino|yes|y'),
+    ]
+    choices = ['NA', 'No', 'No', 'Yes']
+    return pd.Series(np.select(conditions, choices, default='NA'), index=series.index)
+
+
+def clean_sexual_orientation_vectorized(series):
+    category = classify_column(sexual_orientation_rules, sexual_orientation_text(series)).fillna('NA')
+    return pd.Series(category.to_numpy(), index=series.index)
+
+
+def clean_insurance_type_vectorized(series):
+    category = classify_column(insurance_rules, text_cells(series)).fillna('NA')
+    return pd.Series(category.to_numpy(), index=series.index)
+
+
+def clean_household_size_vectorized(series):
+    size, ok = as_int(series)
+    conditions = [~ok | (size < 1) | (size > 30), size <= 4, size <= 7, size <= 10]
+    choices = ['NA', size.astype('Int64').astype(str), '5-7', '8-10']
+    return pd.Series(np.select(conditions, choices, default='10+'), index=series.index)
+
+
+def clean_income_vectorized(series):
+    text = text_cells(series).str.strip().str.lower()
+    income, ok = as_float(series)
+    conditions = [
+        series.isna() | text.isin(['', 'missing', 'na', 'nan', 'none']) | ~ok | (income < 0) | (income > 14000),
+        income < 3000,
+        income < 7000,
+    ]
+    choices = ['NA', 'Low', 'Middle']
+    return pd.Series(np.select(conditions, choices, default='High'), index=series.index)
+
+
+def clean_distance_vectorized(series):
+    distance, ok = as_float(series)
+    # nan compares false to everything so a literal 'nan' string falls through to 'Long' like it does in clean_distance
+    conditions = [series.isna() | ~ok, (distance < 0) | (distance > 3000), distance < 20, distance < 120]
+    choices = ['NA', 'Missing', 'Short', 'Medium']
+    return pd.Series(np.select(conditions, choices, default='Long'), index=series.index)
+
+
+def classify_referral_source_vectorized(series):
+    referral = referral_text(series)
+    missing = referral.isin(['', 'missing'])
+    category = classify_column(referral_rules, referral).fillna('Unknown')
+    return pd.Series(np.where(missing, 'NA', category), index=series.index)
+
+
+def clean_referred_by_vectorized(series):
+    name = text_cells(series).str.strip()
+    missing = name.str.lower().isin(['missing', 'na', 'n/a', 'not available', ''])
+    return pd.Series(np.where(missing, 'NA', name.str.title()), index=series.index)
+
+
+def classify_assistance_type_vectorized(series):
+    text = assistance_text(series)
+    missing = series.isna() | text.isin(['na', 'missing', '', 'n/a'])
+
+    matches = classify_all_column(assistance_rules, text)
+    counts = matches.sum(axis=1)
+    first_match = matches.astype(int).idxmax(axis=1) if len(matches) else pd.Series(dtype=object)
+
+    conditions = [missing, text.eq('multiple') | (counts > 1), counts.eq(1)]
+    choices = ['NA', 'Multiple', first_match]
+    return pd.Series(np.select(conditions, choices, default='Other'), index=series.index)
+
+
+def clean_amount_vectorized(series):
+    text = text_cells(series)
+    missing = series.isna() | text.str.strip().str.lower().isin(['na', 'missing', '', 'n/a'])
+    value_str = text.str.replace('$', '', regex=False).str.replace(',', '', regex=False).str.strip()
+    valid = ~missing & value_str.str.match(r'^\d+(\.\d{1,2})?$')
+
+    out = np.full(len(series), 'NA', dtype=object)
+    out[valid.to_numpy()] = value_str[valid].astype(float).to_numpy()
+    return to_series(out, series.index)
+
+
+def clean_payment_method_vectorized(series):
+    method_str = text_cells(series).str.strip().str.lower()
+    conditions = [
+        series.isna() | method_str.isin(['?', 'na', 'missing', '']) | method_str.str.isnumeric(),
+        method_str.str.contains('pending', regex=False),
+        method_str.str.contains('cash', regex=False),
+        search(method_str, r'\bcc\b|\bcredit\b|\bc/c\b'),
+        search(method_str, 'ach|bank transaction|eft'),
+        method_str.str.match(r'^ck\b.*|^check$'),
+        method_str.str.contains('gc', regex=False),
+        method_str.str.fullmatch(r'(je|journal entry)'),
+        method_str.str.contains('ncs due', regex=False),
+    ]
+    choices = ['NA', 'Pending', 'Cash', 'Credit Card', 'Bank Transfer', 'Check', 'Gift Card', 'Journal Entry',
+               'Internal Transfer']
+    return pd.Series(np.select(conditions, choices, default='Other'), index=series.index)
+
+
+def clean_payable_to_vectorized(series):
+    text = text_cells(series)
+    missing = series.isna() | text.str.strip().str.lower().isin(['na', 'missing', '?', ''])
+    name = text.str.replace(r'\s+', ' ', regex=True).str.strip()
+
+    # split into one column per word position, fix the words column by column and glue them back together
+    acronyms = ['LLC', 'PC', 'MD', 'INC', 'DBA', 'PLLC', 'PA']
+    words = name.where(~missing, '').str.split(' ', expand=True)
+    cleaned = None
+    for position in words.columns:
+        word = words[position]
+        upper = word.str.upper()
+        word = upper.where(upper.isin(acronyms), word.str.capitalize())
+        cleaned = word if cleaned is None else cleaned.where(word.isna(), cleaned + ' ' + word)
+
+    return pd.Series(np.where(missing, 'NA', cleaned), index=series.index)
+
+
+def clean_notified_vectorized(series):
+    val = text_cells(series).str.strip().str.lower()
+    conditions = [
+        series.isna() | val.isin(['missing', '', '?', 'na', 'n/a']),
+        val.eq('no'),
+        val.eq('yes'),
+        val.eq('hold'),
+        val.str.match(r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})|(\d{4}[/-]\d{1,2}[/-]\d{1,2})'),
+    ]
+    choices = ['NA', 'No', 'Yes', 'Pending', 'Yes']
+    return pd.Series(np.select(conditions, choices, default='NA'), index=series.index)
+
+
+def clean_application_signed_vectorized(series):
+    val = text_cells(series).str.strip().str.lower()
+    conditions = [
+        series.isna() | val.isin(['', 'missing', '?', 'na', 'n/a', 'not available']),
+        val.isin(['yes', 'yeah', 'y']),
+        val.isin(['no', 'n']),
+    ]
+    choices = ['NA', 'Yes', 'No']
+    return pd.Series(np.select(conditions, choices, default='NA'), index=series.index)
+
+
+def clean_notes_vectorized(series):
+    missing = series.isna() | text_cells(series).str.strip().eq('')
+    return to_series(series.where(~missing, 'NA'), series.index)
+
+
+# dates: pd.to_datetime on one cell at a time has to guess the format (and usually fall back to dateutil) for every
+# single cell, which made the date columns most of the cleaning time. parse_dates does a whole column instead: real
+# dates (what excel gives us) are converted in one go, text in the layouts below is parsed with an explicit format,
+# and anything left over goes through pd.to_datetime once per distinct value so odd entries still come out exactly
+# like the per-cell functions.
+date_types = [datetime, pd.Timestamp, date]
+date_formats = {
+    r'\d{4}-\d{2}-\d{2}': '%Y-%m-%d',
+    r'\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}': '%Y-%m-%d %H:%M:%S',
+    r'\d{1,2}/\d{1,2}/\d{4}': '%m/%d/%Y',
+}
+
+
+# returns the parsed timestamps (NaT where there is no date) plus a mask of which cells pd.to_datetime would have
+# accepted without raising
+def parse_dates(series, format=None):
+    if pd.api.types.is_datetime64_dtype(series):
+        return series.astype('datetime64[ns]'), pd.Series(True, index=series.index)
+
+    series = series.astype(object)
+    stamps = pd.Series(pd.NaT, index=series.index, dtype='datetime64[ns]')
+    missing = series.isna()
+
+    is_date = series.map(type).isin(date_types) & ~missing
+    try:
+        stamps[is_date] = pd.to_datetime(series[is_date])
+    except (ValueError, TypeError):
+        pass  # mixed timezones or out of range, leave them for the slow path
+
+    strings = string_cells(series)
+    layouts = {None: format} if format is not None else date_formats
+    for pattern, layout in layouts.items():
+        rows = strings.notna() if pattern is None else strings.str.fullmatch(pattern, na=False)
+        stamps[rows] = pd.to_datetime(strings[rows], format=layout, errors='coerce')
+
+    def parse_one(value):
+        try:
+            parsed = pd.to_datetime(value, errors='raise', format=format)
+        except (ValueError, TypeError):
+            return pd.NaT, False
+        if isinstance(parsed, pd.Timestamp) and parsed.tzinfo is not None:
+            parsed = parsed.tz_localize(None)
+        return parsed, True
+
+    ok = missing | stamps.notna()
+    rest = ~ok
+    if rest.any():
+        parsed, _ = clean_unique(series[rest], parse_one)
+        stamps[rest] = pd.to_datetime([stamp for stamp, _ in parsed])
+        ok[rest] = [accepted for _, accepted in parsed]
+    return stamps, ok
+
+
+def clean_grant_req_date_vectorized(series):
+    stamps, ok = parse_dates(series)
+    valid = ok & stamps.notna() & ~text_cells(series).str.strip().eq('')
+    out = np.full(len(series), 'NA', dtype=object)
+    out[valid.to_numpy()] = stamps[valid].dt.strftime('%m/%d/%Y').to_numpy()
+    return to_series(out, series.index)
+
+
+def clean_payment_status_vectorized(series):
+    series = series.astype(object)
+    stamps, ok = parse_dates(series)
+    out = stamps.dt.date.astype(object).where(ok, 'NA')
+    out = out.mask(series.eq('Yes'), 'Yes').mask(series.eq('No'), 'No')
+    return to_series(out, series.index)
+
+
+def clean_dob_vectorized(series):
+    stamps, ok = parse_dates(series, format='%Y-%m-%d')
+    out = stamps.dt.date.astype(object).where(ok & stamps.notna(), pd.NA)
+    return to_series(out, series.index)
+
+
+# per-cell cleaner -> whole-column version
+vectorized_cleaners = {
+    clean_patient_id: clean_patient_id_vectorized,
+    clean_grant_req_date: clean_grant_req_date_vectorized,
+    clean_app_year: clean_app_year_vectorized,
+    clean_payment_status: clean_payment_status_vectorized,
+    clean_reason_pending: clean_reason_pending_vectorized,
+    clean_city: clean_city_vectorized,
+    clean_state: clean_state_vectorized,
+    clean_language_column: clean_language_column_vectorized,
+    clean_dob: clean_dob_vectorized,
+    clean_marriage_status: clean_marriage_status_vectorized,
+    clean_gender: clean_gender_vectorized,
+    clean_race: clean_race_vectorized,
+    clean_hispanic_latino: clean_hispanic_latino_vectorized,
+    clean_sexual_orientation: clean_sexual_orientation_vectorized,
+    clean_insurance_type: clean_insurance_type_vectorized,
+    clean_household_size: clean_household_size_vectorized,
+    clean_income: clean_income_vectorized,
+    clean_distance: clean_distance_vectorized,
+    classify_referral_source: classify_referral_source_vectorized,
+    clean_referred_by: clean_referred_by_vectorized,
+    classify_assistance_type: classify_assistance_type_vectorized,
+    clean_amount: clean_amount_vectorized,
+    clean_payment_method: clean_payment_method_vectorized,
+    clean_payable_to: clean_payable_to_vectorized,
+    clean_notified: clean_notified_vectorized,
+    clean_application_signed: clean_application_signed_vectorized,
+    clean_notes: clean_notes_vectorized,
+}
+
+engines = ['apply', 'vectorized', 'unique']
+
+# column -> rule table of its regex classifier (for --rule-report)
+rule_tables = {
+    'marital_status': marriage_rules,
+    'race': race_rules,
+    'sexual_orientation': sexual_orientation_rules,
+    'insurance_type': insurance_rules,
+    'referral_source': referral_rules,
+    'assistance_type': assistance_rules,
+}
+
+
+# *** clean unique values once ***
+# most raw columns only have a few dozen different spellings repeated over thousands of rows, so the 'unique' engine
+# runs the normal per-cell function once per distinct value and copies the result back to every row through the
+# factorize codes. values are grouped by type as well as value, so 1, 1.0 and '1' still get cleaned separately.
+def clean_unique(series, cleaner):
+    value_codes, _ = pd.factorize(series, use_na_sentinel=False)
+    type_codes, types = pd.factorize(series.map(type), use_na_sentinel=False)
+    codes, _ = pd.factorize(value_codes * max(len(types), 1) + type_codes)
+
+    # first row of every distinct (value, type) pair
+    _, first_rows = np.unique(codes, return_index=True)
+
+    cleaned = series.iloc[first_rows].apply(cleaner).to_numpy(dtype=object)
+    return to_series(cleaned[codes], series.index), len(first_rows)
+
+
+# run one cleaner over a column with the chosen engine. if a stats dict is passed in, the 'unique' engine records
+# how many rows and how many distinct values each column had
+def clean_column(series, cleaner, engine='apply', stats=None):
+    if engine == 'vectorized' and cleaner in vectorized_cleaners:
+        return vectorized_cleaners[cleaner](series)
+    if engine == 'unique':
+        cleaned, cardinality = clean_unique(series, cleaner)
+        if stats is not None:
+            stats[series.name] = {'rows': len(series), 'unique': cardinality}
+        return cleaned
+    return series.apply(cleaner)
+
+
+# *** fast workbook reader ***
+# pd.read_excel wraps every single cell of the sheet in an openpyxl cell object before converting it, which took
+# longer than the cleaning. read_sheet streams the rows as plain values instead, drops the columns clean_frame never
+# looks at, and converts the cells the same way pandas does (whole numbers -> int, empty -> '', excel errors -> nan)
+# before handing them to the same TextParser read_excel uses, so the dataframe comes out the same.
+# on top of that the parsed sheet is cached next to the workbook, keyed on a hash of the workbook bytes, so reruns on
+# an unchanged workbook (check, incremental, the dashboard rebuild) skip opening it at all.
+sheet_cache_dir = ".sheet_cache"
+
+
+def sheet_value(value):
+    if value is None:
+        return ''
+    if type(value) in (int, float):
+        whole = int(value) if np.isfinite(value) else None
+        return whole if whole == value else float(value)
+    if type(value) is str and value in ERROR_CODES:
+        return np.nan
+    return value
+
+
+def read_sheet(input_file, sheet_name=None):
+    workbook = openpyxl.load_workbook(input_file, read_only=True, data_only=True, keep_links=False)
+    try:
+        sheet = workbook[sheet_name] if sheet_name is not None else workbook.worksheets[0]
+        sheet.reset_dimensions()
+        data = []
+        for row in sheet.iter_rows(values_only=True):
+            row = [sheet_value(value) for value in row]
+            while row and row[-1] == '':
+                row.pop()
+            data.append(row)
+    finally:
+        workbook.close()
+
+    # trailing empty rows go, short rows get padded out to the widest one (same as read_excel)
+    while data and not data[-1]:
+        data.pop()
+    if not data:
+        return pd.DataFrame()
+    width = max(len(row) for row in data)
+    data = [row + [''] * (width - len(row)) for row in data]
+
+    # only the columns clean_frame works on
+    used = {column for column, _ in column_cleaners} | {'remaining_balance', 'request_status', 'pt_zip'}
+    names = rename_columns(pd.DataFrame(columns=data[0])).columns
+    keep = [i for i, name in enumerate(names) if name in used]
+    data = [[row[i] for i in keep] for row in data]
+
+    return TextParser(data, header=0, skip_blank_lines=False).read()
+
+
+def read_sheet_cached(input_file, sheet_name=None):
+    with open(input_file, 'rb') as f:
+        key = hashlib.sha1(f.read())
+    key.update(f"{sheet_name}|{cleaner_version()}".encode())
+
+    stem = os.path.splitext(os.path.basename(input_file))[0]
+    cache_dir = os.path.join(os.path.dirname(input_file), sheet_cache_dir)
+    cache_file = os.path.join(cache_dir, f"{stem}.{key.hexdigest()[:16]}.pkl")
+    if os.path.exists(cache_file):
+        return pd.read_pickle(cache_file)
+
+    df = read_sheet(input_file, sheet_name=sheet_name)
+
+    # only keep the newest copy of each workbook
+    os.makedirs(cache_dir, exist_ok=True)
+    for name in os.listdir(cache_dir):
+        if name.startswith(stem + ".") and name.endswith(".pkl") and name.count(".") == stem.count(".") + 2:
+            os.remove(os.path.join(cache_dir, name))
+    df.to_pickle(cache_file)
+    return df
+
+
+def load_data(input_file, sheet_name=None):
     # load file based on extension
     if input_file.endswith('.xlsx'):
-        df = pd.read_excel(input_file, sheet_name=sheet_name)
+        df = read_sheet_cached(input_file, sheet_name=sheet_name)
     else:
         df = pd.read_csv(input_file)
+    return rename_columns(df)
+
 
+def rename_columns(df):
     # standardize column names (not necessary but wrote all my code based on this so im too lazy to go back and change all that)
     df.columns = (
         df.columns
@@ -676,68 +1258,456 @@ def clean_data(input_file, sheet_name=None):
         'type_of_assistance_class': 'assistance_type',
         'patient_letter_notified_directlyindirectly_through_rep': 'notified'
     })
+    return df
+
+
+# *** parallel column cleaning ***
+# every column below only needs its own raw values, so with --workers they can be cleaned side by side in separate
+# processes. days_to_support, age and age_category need other cleaned columns and are done afterwards in clean_frame.
+column_cleaners = [
+    ('patient_id', clean_patient_id),
+    ('grant_req_date', clean_grant_req_date),
+    ('app_year', clean_app_year),
+    ('payment_submitted', clean_payment_status),
+    ('reason_pending', clean_reason_pending),
+    ('pt_city', clean_city),
+    ('pt_state', clean_state),
+    ('language', clean_language_column),
+    ('dob', clean_dob),
+    ('marital_status', clean_marriage_status),
+    ('gender', clean_gender),
+    ('race', clean_race),
+    ('hispaniclatino', clean_hispanic_latino),
+    ('sexual_orientation', clean_sexual_orientation),
+    ('insurance_type', clean_insurance_type),
+    ('household_size', clean_household_size),
+    ('total_household_gross_monthly_income', clean_income),
+    ('distance', clean_distance),
+    ('referral_source', classify_referral_source),
+    ('referred_by', clean_referred_by),
+    ('assistance_type', classify_assistance_type),
+    ('amount', clean_amount),
+    ('payment_method', clean_payment_method),
+    ('payable_to', clean_payable_to),
+    ('notified', clean_notified),
+    ('application_signed', clean_application_signed),
+    ('notes', clean_notes),
+]
+
+
+def clean_column_task(series, cleaner, engine):
+    stats = {}
+    return clean_column(series, cleaner, engine, stats), stats
+
+
+def clean_columns_parallel(df, engine='apply', workers=2, stats=None):
+    tasks = list(column_cleaners)
+    if engine != 'vectorized':
+        tasks.append(('remaining_balance', clean_remaining_balance))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {column: pool.submit(clean_column_task, df[column], cleaner, engine) for column, cleaner in tasks}
+
+        results = {}
+        for column, future in futures.items():
+            results[column], column_stats = future.result()
+            if stats is not None:
+                stats.update(column_stats)
+    return results
+
+
+def clean_data(input_file, sheet_name=None, engine='apply', stats=None, workers=1, reference_date=None, profile=None):
+    df = run_stage(profile, 'load', lambda: load_data(input_file, sheet_name=sheet_name))
+    return clean_frame(df, engine=engine, stats=stats, workers=workers, reference_date=reference_date, profile=profile)
+
+
+# *** profiling ***
+# with --profile a list is passed down and every stage of the run adds a record to it: wall time, rows, how many
+# distinct values went in and came out, and (while tracemalloc is running) how much memory the stage kept and peaked
+# at. without --profile profile is None and run_stage just calls the function.
+def run_stage(profile, name, function, source=None):
+    if profile is None:
+        return function()
+
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+    start = time.perf_counter()
+    result = function()
+    seconds = time.perf_counter() - start
+    if tracing:
+        after, peak = tracemalloc.get_traced_memory()
+
+    rows = source if source is not None else result
+    profile.append({
+        'stage': name,
+        'seconds': seconds,
+        'rows': len(rows) if hasattr(rows, '__len__') else None,
+        'input_unique': cardinality(source),
+        'output_unique': cardinality(result),
+        'memory_delta_mb': (after - before) / 2**20 if tracing else None,
+        'memory_peak_mb': (peak - before) / 2**20 if tracing else None,
+    })
+    return result
+
+
+# distinct values in a column (distinct rows for a frame), None for anything else
+def cardinality(values):
+    try:
+        if isinstance(values, pd.Series):
+            return int(values.nunique(dropna=False))
+        if isinstance(values, pd.DataFrame):
+            return len(values.drop_duplicates())
+    except TypeError:
+        pass  # e.g. the dicts clean_remaining_balance returns
+    return None
+
+
+def profile_path(output_file):
+    return os.path.splitext(output_file)[0] + ".profile.json"
+
+
+# clean an already loaded (and renamed) dataframe. works on any subset of rows, not just a whole file
+def clean_frame(df, engine='apply', stats=None, workers=1, reference_date=None, profile=None):
+    df = df.copy()
+
+    def stage(name, function, source=None):
+        return run_stage(profile, name, function, source)
+
+    # with more than one worker the independent columns are all cleaned up front in a process pool. anything that
+    # wasnt (and every column when workers is 1) gets cleaned right here, in the same order as always
+    precleaned = stage('parallel columns', lambda: clean_columns_parallel(df, engine, workers, stats), df) if workers > 1 else {}
+
+    def cleaned(column, cleaner):
+        if column in precleaned:
+            return precleaned.pop(column)
+        return stage(column, lambda: clean_column(df[column], cleaner, engine, stats), df[column])
 
     # apply cleaning functions
-    df['patient_id'] = df['patient_id'].apply(clean_patient_id)
-    df['grant_req_date'] = df['grant_req_date'].apply(clean_grant_req_date)
-    df['app_year'] = df['app_year'].apply(clean_app_year)
-    df['remaining_balance_cleaned'] = df['remaining_balance'].apply(clean_remaining_balance)
-    
-    # spcial case normalize dictionary into separate columns
-    df[['remaining_balance', 'over_balance', 'balance_status']] = pd.json_normalize(df['remaining_balance_cleaned'])
+    df['patient_id'] = cleaned('patient_id', clean_patient_id)
+    df['grant_req_date'] = cleaned('grant_req_date', clean_grant_req_date)
+    df['app_year'] = cleaned('app_year', clean_app_year)
+
+    if engine == 'vectorized':
+        df[['remaining_balance', 'over_balance', 'balance_status']] = stage(
+            'remaining_balance', lambda: clean_remaining_balance_vectorized(df['remaining_balance']), df['remaining_balance'])
+    else:
+        df['remaining_balance_cleaned'] = cleaned('remaining_balance', clean_remaining_balance)
 
-    # special case drop the temporary column
-    df.drop(columns=['remaining_balance_cleaned'], inplace=True)
+        # spcial case normalize dictionary into separate columns
+        df[['remaining_balance', 'over_balance', 'balance_status']] = stage(
+            'remaining_balance split', lambda: pd.json_normalize(df['remaining_balance_cleaned'].tolist()).set_axis(df.index))
+
+        # special case drop the temporary column
+        df.drop(columns=['remaining_balance_cleaned'], inplace=True)
 
     # special case request_status using allowed values
     allowed_statuses = ['Approved', 'Denied', 'Pending']
-    df['request_status'] = df['request_status'].where(df['request_status'].isin(allowed_statuses), 'NA')
-
-    df['payment_submitted'] = df['payment_submitted'].apply(clean_payment_status)
-    df['grant_req_date'] = pd.to_datetime(df['grant_req_date'], errors='coerce').dt.date
-    df['days_to_support'] = df.apply(calculate_days_to_support, axis=1)
-    df['reason_pending'] = df['reason_pending'].apply(clean_reason_pending)
-    df['pt_city'] = df['pt_city'].apply(clean_city)
-    df['pt_state'] = df['pt_state'].apply(clean_state)
-    df['pt_zip'] = df['pt_zip'].astype(str)
+    df['request_status'] = stage('request_status', lambda: df['request_status'].where(df['request_status'].isin(allowed_statuses), 'NA'), df['request_status'])
+
+    df['payment_submitted'] = cleaned('payment_submitted', clean_payment_status)
+    df['grant_req_date'] = stage('grant_req_date to date', lambda: pd.to_datetime(df['grant_req_date'], format='%m/%d/%Y', errors='coerce').dt.date, df['grant_req_date'])
+    df['days_to_support'] = stage('days_to_support', lambda: calculate_days_to_support(df['payment_submitted'], df['grant_req_date']), df['payment_submitted'])
+    df['reason_pending'] = cleaned('reason_pending', clean_reason_pending)
+    df['pt_city'] = cleaned('pt_city', clean_city)
+    df['pt_state'] = cleaned('pt_state', clean_state)
+    df['pt_zip'] = stage('pt_zip', lambda: df['pt_zip'].astype(str), df['pt_zip'])
     
     # special case apply latitude and longitude
-    df[['lat', 'lng']] = df.apply(apply_lat_lng, axis=1)
+    df[['lat', 'lng']] = stage('lat/lng', lambda: lookup_lat_lng(df['pt_zip']), df['pt_zip'])
     
-    df['language'] = df['language'].apply(clean_language_column)
-    df['dob'] = df['dob'].apply(clean_dob)
+    df['language'] = cleaned('language', clean_language_column)
+    df['dob'] = cleaned('dob', clean_dob)
     
     # special case apply 'age' and 'age_category' columns
-    df['age'] = add_age_column(df['dob'])  # apply to dob column
-    df['age_category'] = add_age_category_column(df['age'])  # apply to age column
-
-    df['marital_status'] = df['marital_status'].apply(clean_marriage_status)
-    df['gender'] = df['gender'].apply(clean_gender)
-    df['race'] = df['race'].apply(clean_race)
-    df['hispaniclatino'] = df['hispaniclatino'].apply(clean_hispanic_latino)
-    df['sexual_orientation'] = df['sexual_orientation'].apply(clean_sexual_orientation)
-    df['insurance_type'] = df['insurance_type'].apply(clean_insurance_type)
-    df['household_size'] = df['household_size'].apply(clean_household_size)
-    df['total_household_gross_monthly_income'] = df['total_household_gross_monthly_income'].apply(clean_income)
-    df['distance'] = df['distance'].apply(clean_distance)
-    df['referral_source'] = df['referral_source'].apply(classify_referral_source)
-    df['referred_by'] = df['referred_by'].apply(clean_referred_by)
-    df['assistance_type'] = df['assistance_type'].apply(classify_assistance_type)
-    df['amount'] = df['amount'].apply(clean_amount)
-    df['payment_method'] = df['payment_method'].apply(clean_payment_method)
-    df['payable_to'] = df['payable_to'].apply(clean_payable_to)
-    df['notified'] = df['notified'].apply(clean_notified)
-    df['application_signed'] = df['application_signed'].apply(clean_application_signed)
-    df['notes'] = df['notes'].apply(clean_notes)
+    df['age'] = stage('age', lambda: add_age_column(df['dob'], reference_date), df['dob'])  # apply to dob column
+    if engine == 'vectorized':
+        df['age_category'] = stage('age_category', lambda: add_age_category_column_vectorized(df['age']), df['age'])
+    else:
+        df['age_category'] = stage('age_category', lambda: add_age_category_column(df['age']), df['age'])  # apply to age column
+
+    df['marital_status'] = cleaned('marital_status', clean_marriage_status)
+    df['gender'] = cleaned('gender', clean_gender)
+    df['race'] = cleaned('race', clean_race)
+    df['hispaniclatino'] = cleaned('hispaniclatino', clean_hispanic_latino)
+    df['sexual_orientation'] = cleaned('sexual_orientation', clean_sexual_orientation)
+    df['insurance_type'] = cleaned('insurance_type', clean_insurance_type)
+    df['household_size'] = cleaned('household_size', clean_household_size)
+    df['total_household_gross_monthly_income'] = cleaned('total_household_gross_monthly_income', clean_income)
+    df['distance'] = cleaned('distance', clean_distance)
+    df['referral_source'] = cleaned('referral_source', classify_referral_source)
+    df['referred_by'] = cleaned('referred_by', clean_referred_by)
+    df['assistance_type'] = cleaned('assistance_type', classify_assistance_type)
+    df['amount'] = cleaned('amount', clean_amount)
+    df['payment_method'] = cleaned('payment_method', clean_payment_method)
+    df['payable_to'] = cleaned('payable_to', clean_payable_to)
+    df['notified'] = cleaned('notified', clean_notified)
+    df['application_signed'] = cleaned('application_signed', clean_application_signed)
+    df['notes'] = cleaned('notes', clean_notes)
 
     return df
 
-def main():
-    # check if input file is provided
-    if len(sys.argv) < 2:
-        raise ValueError("No input file provided. Usage: python datacleaning.py <input_file>")
 
-    input_file = sys.argv[1]
+# equivalence check: clean the same file with the per-cell functions and with another engine, and compare what
+# would end up in the csv column by column
+def check_engine(input_file, sheet_name=None, engine='vectorized'):
+    reference_date = date.today()
+    expected = clean_data(input_file, sheet_name=sheet_name, engine='apply', reference_date=reference_date)
+    actual = clean_data(input_file, sheet_name=sheet_name, engine=engine, reference_date=reference_date)
+
+    if list(expected.columns) != list(actual.columns):
+        return ['<column order>']
+
+    return [column for column in expected.columns
+            if expected[[column]].to_csv(index=False) != actual[[column]].to_csv(index=False)]
+
+
+# *** streaming csv cleaning ***
+# multi-year exports dont have to fit in memory: the csv is read chunksize rows at a time and every cleaned chunk is
+# appended to the output, so only one chunk is ever held. read_csv guesses dtypes per chunk though (a chunk where a
+# column happens to be all numbers would get ints instead of text), so a first pass works out the dtype every column
+# gets from a one-shot read and then every chunk is read with those. that keeps the output identical to a normal run.
+def csv_dtypes(input_file, chunksize):
+    seen = {}
+    for chunk in pd.read_csv(input_file, chunksize=chunksize):
+        for column, dtype in chunk.dtypes.items():
+            seen.setdefault(column, set()).add(dtype)
+
+    dtypes = {}
+    for column, kinds in seen.items():
+        if all(pd.api.types.is_numeric_dtype(kind) and not pd.api.types.is_bool_dtype(kind) for kind in kinds):
+            dtypes[column] = np.result_type(*kinds)  # e.g. ints in one chunk and ints with blanks in another -> float
+        elif len(kinds) == 1:
+            dtypes[column] = kinds.pop()
+        else:
+            dtypes[column] = object
+    return dtypes
+
+
+def clean_csv_chunks(input_file, output_file, chunksize, engine='apply', workers=1, reference_date=None):
+    # every chunk has to work out ages from the same day
+    reference_date = reference_date or date.today()
+    dtypes = csv_dtypes(input_file, chunksize)
+
+    rows = 0
+    for number, chunk in enumerate(pd.read_csv(input_file, chunksize=chunksize, dtype=dtypes)):
+        cleaned = clean_frame(rename_columns(chunk), engine=engine, workers=workers, reference_date=reference_date)
+        cleaned.to_csv(output_file, index=False, mode='w' if number == 0 else 'a', header=number == 0)
+        rows += len(cleaned)
+    return rows
+
+
+# *** incremental cleaning ***
+# the monthly export is the whole history plus a few new rows, so instead of cleaning everything again we keep a
+# manifest next to the _CLEAN.csv with a fingerprint of every raw row. rows are keyed on patient_id + grant_req_date
+# (plus a running number, since one patient can get several grants on the same day). only new or changed rows get
+# cleaned, everything else is copied from the existing output, and rows that disappeared from the sheet are dropped.
+key_columns = ['patient_id', 'grant_req_date']
+
+
+def manifest_path(output_file):
+    return os.path.splitext(output_file)[0] + ".manifest.json"
+
+
+# changing the cleaning code has to force a full rebuild, so the manifest remembers which version of the code made it.
+# that is this file, the rules it classifies with and the modules that build the rollup / metrics files next to the output
+cleaner_modules = ['datacleaning.py', 'rules.py', 'rollups.py', 'metrics.py']
+
+
+def cleaner_version():
+    folder = os.path.dirname(os.path.abspath(__file__))
+    version = hashlib.sha1()
+    for module in cleaner_modules:
+        with open(os.path.join(folder, module), 'rb') as f:
+            version.update(f.read())
+    return version.hexdigest()
+
+
+def row_manifest(raw):
+    rows = text_cells(raw[key_columns[0]]).to_frame()
+    rows[key_columns[1]] = text_cells(raw[key_columns[1]])
+    rows['occurrence'] = rows.groupby(key_columns).cumcount()
+    rows['fingerprint'] = pd.util.hash_pandas_object(raw.astype(object).astype(str), index=False).astype(str).to_numpy()
+    return rows
+
+
+# the csv exactly as to_csv would write it, as strings, so old and new rows can be mixed without changing any formatting
+def as_csv_text(df):
+    return pd.read_csv(io.StringIO(df.to_csv(index=False)), dtype=str, keep_default_na=False)
+
+
+def clean_incremental(input_file, output_file, sheet_name=None, engine='apply', workers=1, reference_date=None):
+    raw = load_data(input_file, sheet_name=sheet_name)
+    rows = row_manifest(raw)
+
+    previous = None
+    old_rows = None
+    manifest_file = manifest_path(output_file)
+    if os.path.exists(manifest_file) and os.path.exists(output_file):
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+        if manifest.get('cleaner_version') == cleaner_version() and manifest.get('columns') == list(raw.columns):
+            previous = pd.read_csv(output_file, dtype=str, keep_default_na=False)
+            old_rows = pd.DataFrame(manifest['rows']).astype({'occurrence': int, 'fingerprint': str})
+            if len(old_rows) != len(previous):
+                previous = old_rows = None
+
+    if old_rows is None:
+        reuse = pd.Series(-1, index=rows.index)
+        matched = 0
+    else:
+        old_rows['position'] = np.arange(len(old_rows))
+        merged = rows.merge(old_rows, on=key_columns + ['occurrence'], how='left', suffixes=('', '_old'))
+        matched = int(merged['position'].notna().sum())
+        same = merged['fingerprint'].eq(merged['fingerprint_old'])
+        reuse = merged['position'].where(merged['position'].notna() & same, -1).astype(int)
+        reuse.index = rows.index
+
+    dirty = reuse.lt(0).to_numpy()
+    parts = []
+    if dirty.any():
+        parts.append(as_csv_text(clean_frame(raw[dirty], engine=engine, workers=workers, reference_date=reference_date)).set_axis(raw.index[dirty]))
+    if not dirty.all():
+        parts.append(previous.iloc[reuse[~dirty].to_numpy()].set_axis(raw.index[~dirty]))
+    cleaned = pd.concat(parts).sort_index()
+
+    # age depends on the reference date, so it is recomputed for every row and not just the ones that changed
+    age = add_age_column(cleaned['dob'].replace('', None), reference_date)
+    age_category = add_age_category_column_vectorized(age) if engine == 'vectorized' else add_age_category_column(age)
+    cleaned['age'] = age.astype(object).where(age.notna(), '').astype(str).to_numpy()
+    cleaned['age_category'] = age_category.to_numpy()
+
+    cleaned.to_csv(output_file, index=False)
+
+    # old rows that made it into the new output unchanged
+    if previous is not None:
+        reused = np.zeros(len(previous), dtype=bool)
+        reused[reuse[~dirty].to_numpy()] = True
+
+    # only the periods holding a new, changed or removed row get their rollups rebuilt
+    rollup_file = rollup_path(output_file)
+    if previous is not None and os.path.exists(rollup_file):
+        changed_dates = pd.concat([cleaned.loc[raw.index[dirty], 'grant_req_date'], previous.loc[~reused, 'grant_req_date']])
+        rollups = update_rollups(pd.read_csv(rollup_file, dtype={'period': str}), cleaned, changed_dates)
+    else:
+        rollups = build_rollups(cleaned)
+    rollups.to_csv(rollup_file, index=False)
+
+    # if rows were only added they go straight into the metric store, anything else rebuilds it
+    metrics_file = metrics_path(output_file)
+    if previous is not None and reused.all() and os.path.exists(metrics_file):
+        store = add_rows(load_store(metrics_file), cleaned.loc[raw.index[dirty]])
+    else:
+        store = build_store(cleaned)
+    save_store(store, metrics_file)
+
+    with open(manifest_file, 'w') as f:
+        json.dump({
+            'cleaner_version': cleaner_version(),
+            'columns': list(raw.columns),
+            'rows': {column: rows[column].tolist() for column in rows.columns},
+        }, f)
+
+    changes = {
+        'new': len(rows) - matched,
+        'changed': int(dirty.sum()) - (len(rows) - matched),
+        'unchanged': int((~dirty).sum()),
+        'deleted': (len(old_rows) - matched) if old_rows is not None else 0,
+    }
+    return cleaned, changes
+
+
+# *** typed columnar output ***
+# the csv loses every dtype, so the dashboard has to guess them again from a file full of 'NA' strings.
+# the parquet copy keeps real dates, floats and nullable ints, and stores the repetitive text columns as categoricals
+# (parquet dictionary encodes those). 'NA' is written as a real missing value, same as read_csv treats it.
+date_columns = ['grant_req_date', 'dob']
+float_columns = ['remaining_balance', 'amount', 'days_to_support', 'lat', 'lng']
+integer_columns = ['patient_id', 'app_year', 'age']
+categorical_columns = [
+    'request_status', 'payment_submitted', 'reason_pending', 'pt_city', 'pt_state', 'pt_zip', 'language',
+    'marital_status', 'gender', 'race', 'hispaniclatino', 'sexual_orientation', 'insurance_type', 'household_size',
+    'total_household_gross_monthly_income', 'distance', 'referral_source', 'referred_by', 'assistance_type',
+    'payment_method', 'notified', 'application_signed', 'balance_status', 'age_category']
+
+
+def to_typed_frame(df):
+    typed = df.astype(object).where(~df.isin(['NA', 'nan', '']), np.nan)
+
+    for column in typed.columns:
+        values = typed[column]
+        if column in date_columns:
+            typed[column] = pd.to_datetime(values, errors='coerce')
+        elif column in float_columns:
+            typed[column] = pd.to_numeric(values, errors='coerce').astype(float)
+        elif column in integer_columns:
+            numbers = pd.to_numeric(values, errors='coerce')
+            # only switch to ints if that doesnt throw away any ids
+            if numbers.notna().sum() == values.notna().sum():
+                typed[column] = numbers.astype('Int64')
+            else:
+                typed[column] = values.where(values.isna(), values.astype(str))
+        elif column == 'over_balance':
+            # the incremental merge works on the csv text, so this can be 'True'/'False' as well as real bools
+            typed[column] = values.map({True: True, False: False, 'True': True, 'False': False}).astype('boolean')
+        elif column in categorical_columns:
+            typed[column] = values.where(values.isna(), values.astype(str)).astype('category')
+        else:
+            typed[column] = values.where(values.isna(), values.astype(str))
+
+    return typed
+
+
+def write_parquet(df, output_file):
+    to_typed_frame(df).to_parquet(output_file, index=False)
+
+
+# same typed rows, appended to the sqlite database the dashboard can query instead of the csv files (see database.py),
+# along with the rollups written next to the csv
+def write_sqlite(df, db_file, output_file):
+    database.store_rows(to_typed_frame(df), db_file, output_file)
+    database.store_rows(pd.read_csv(rollup_path(output_file), dtype={'period': str}), db_file, output_file,
+                        table=database.rollup_table, indexes=database.rollup_index_columns)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Clean a PA log export into <input>_CLEAN.csv")
+    parser.add_argument("input_file", help="excel (.xlsx) or csv export to clean")
+    parser.add_argument("--engine", choices=engines, default="apply",
+                        help="'apply' runs the per-cell functions, 'vectorized' cleans whole columns at once, "
+                             "'unique' runs the per-cell functions once per distinct value")
+    parser.add_argument("--check", action="store_true",
+                        help="clean with --engine (vectorized if not given) and with the per-cell functions and report "
+                             "any column where the outputs differ (no file is written)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="clean independent columns in this many processes at once (default 1)")
+    parser.add_argument("--reference-date", type=date.fromisoformat, default=None,
+                        help="work out ages as of this date (YYYY-MM-DD) instead of today, so reruns give the same ages")
+    parser.add_argument("--rule-report", action="store_true",
+                        help="print how many rows each classifier rule catches and how long each rule takes (no file is written)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only clean rows that are new or changed since the last --incremental run and merge them into the existing output")
+    parser.add_argument("--parquet", action="store_true",
+                        help="also write a typed <input>_CLEAN.parquet next to the csv (needs pyarrow)")
+    parser.add_argument("--sqlite", action="store_true",
+                        help=f"also load the cleaned rows into the {database.database_file} sqlite database the dashboard queries, "
+                             "replacing any rows an earlier run of the same file put there")
+    parser.add_argument("--profile", action="store_true",
+                        help="record time, rows, distinct values and memory for every cleaning stage in <input>_CLEAN.profile.json")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="stream a csv input this many rows at a time so memory stays flat however big the file is")
+    args = parser.parse_args()
+
+    if args.chunksize is not None:
+        if args.input_file.endswith('.xlsx'):
+            parser.error("--chunksize only works on csv input")
+        if args.incremental or args.parquet or args.sqlite:
+            parser.error("--chunksize can't be combined with --incremental, --parquet or --sqlite")
+    if args.profile and (args.incremental or args.chunksize is not None):
+        parser.error("--profile only works on a full run (not with --incremental or --chunksize)")
+
+    input_file = args.input_file
 
     # check if input file exists
     if not os.path.exists(input_file):
@@ -747,12 +1717,79 @@ def main():
     output_file = os.path.splitext(input_file)[0] + "_CLEAN.csv"
     sheet_name = "PA Log Sheet" if input_file.endswith(".xlsx") else None
 
+    if args.rule_report:
+        df = load_data(input_file, sheet_name=sheet_name)
+        for column, rules in rule_tables.items():
+            print(f"\n{column}")
+            print(rule_report(rules, df[column]).to_string(index=False))
+        return
+
+    if args.check:
+        engine = args.engine if args.engine != 'apply' else 'vectorized'
+        mismatched = check_engine(input_file, sheet_name=sheet_name, engine=engine)
+        if mismatched:
+            raise SystemExit(f"'{engine}' engine differs from the per-cell functions on: {', '.join(mismatched)}")
+        print(f"'{engine}' engine matches the per-cell functions on {input_file}")
+        return
+
+    # with --profile every stage is timed, and tracemalloc follows the memory each one takes
+    profile = [] if args.profile else None
+    if args.profile:
+        tracemalloc.start()
+        start = time.perf_counter()
+
     # print the input and output file paths
     print(f"Reading from: {input_file}")
-    cleaned_df = clean_data(input_file, sheet_name=sheet_name)
-
-    print(f"Saving cleaned data to: {output_file}")
-    cleaned_df.to_csv(output_file, index=False)
+    if args.chunksize is not None:
+        rows = clean_csv_chunks(input_file, output_file, args.chunksize, engine=args.engine, workers=args.workers,
+                                reference_date=args.reference_date)
+        print(f"Streamed {rows} rows in chunks of {args.chunksize} to: {output_file}")
+    elif args.incremental:
+        cleaned_df, changes = clean_incremental(input_file, output_file, sheet_name=sheet_name, engine=args.engine,
+                                                workers=args.workers, reference_date=args.reference_date)
+        print(f"Rows new: {changes['new']}, changed: {changes['changed']}, unchanged: {changes['unchanged']}, deleted: {changes['deleted']}")
+        print(f"Saved cleaned data to: {output_file}")
+    else:
+        stats = {}
+        cleaned_df = clean_data(input_file, sheet_name=sheet_name, engine=args.engine, stats=stats, workers=args.workers,
+                                reference_date=args.reference_date, profile=profile)
+
+        # with the unique engine, show how few distinct values each column actually had
+        if stats:
+            print(pd.DataFrame.from_dict(stats, orient='index').rename_axis('column').to_string())
+
+        print(f"Saving cleaned data to: {output_file}")
+        run_stage(profile, 'write csv', lambda: cleaned_df.to_csv(output_file, index=False), cleaned_df)
+        run_stage(profile, 'write rollups', lambda: build_rollups(cleaned_df).to_csv(rollup_path(output_file), index=False), cleaned_df)
+        run_stage(profile, 'write metrics', lambda: save_store(build_store(cleaned_df), metrics_path(output_file)), cleaned_df)
+
+    if args.parquet:
+        parquet_file = os.path.splitext(output_file)[0] + ".parquet"
+        print(f"Saving typed copy to: {parquet_file}")
+        run_stage(profile, 'write parquet', lambda: write_parquet(cleaned_df, parquet_file), cleaned_df)
+
+    if args.sqlite:
+        print(f"Loading cleaned rows into: {database.database_file}")
+        run_stage(profile, 'write sqlite', lambda: write_sqlite(cleaned_df, database.database_file, output_file), cleaned_df)
+
+    if args.profile:
+        total_seconds = time.perf_counter() - start
+        tracemalloc.stop()
+        report = pd.DataFrame(profile)
+        print(report.round(3).to_string(index=False))
+        print(f"Total: {total_seconds:.3f}s, slowest stage: {report.loc[report['seconds'].idxmax(), 'stage']}")
+
+        with open(profile_path(output_file), 'w') as f:
+            json.dump({
+                'created': datetime.now().isoformat(timespec='seconds'),
+                'input_file': input_file,
+                'engine': args.engine,
+                'workers': args.workers,
+                'rows': len(cleaned_df),
+                'total_seconds': total_seconds,
+                'stages': profile,
+            }, f, indent=2)
+        print(f"Saved profile to: {profile_path(output_file)}")
 
     print(f"Cleaning completed: {input_file} -> {output_file}")
 
@@ -0,0 +1,80 @@
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+
+# filter index for the dashboard
+# built once per dataset version, after that every filter is answered from the index instead of comparing a whole
+# column again. categorical columns keep a bitmap of row ids for every value (np.packbits, one bit per row) and
+# numeric columns keep their values sorted next to the row ids, so a range is two binary searches. filters are
+# combined with bitwise and/or on the bitmaps. row ids are positions in the frame the index was built from.
+
+
+def build_filter_index(df, categorical_columns, numeric_columns):
+    values = {}
+    for column in categorical_columns:
+        # missing values get their own bitmap so they can be filtered on too
+        column_values = df[column].astype(object).where(df[column].notna(), 'Missing')
+        codes, uniques = pd.factorize(column_values)
+        values[column] = {value: np.packbits(codes == code) for code, value in enumerate(uniques)}
+
+    ranges = {}
+    for column in numeric_columns:
+        numbers = pd.to_numeric(df[column], errors='coerce').astype(float).to_numpy()
+        present = np.flatnonzero(~np.isnan(numbers))
+        order = present[np.argsort(numbers[present], kind='stable')]
+        ranges[column] = (numbers[order], order)
+
+    return {'rows': len(df), 'values': values, 'ranges': ranges}
+
+
+def all_rows(index):
+    return np.packbits(np.ones(index['rows'], dtype=bool))
+
+
+def no_rows(index):
+    return np.packbits(np.zeros(index['rows'], dtype=bool))
+
+
+# rows where the column has any of the given values
+def value_bitmap(index, column, values):
+    bitmaps = index['values'][column]
+    return any_of(index, [bitmaps[value] for value in values if value in bitmaps])
+
+
+# rows where low <= column <= high (either end can be left open or made exclusive), missing values never match
+def range_bitmap(index, column, low=None, high=None, include_low=True, include_high=True):
+    numbers, order = index['ranges'][column]
+    start = 0 if low is None else np.searchsorted(numbers, low, side='left' if include_low else 'right')
+    stop = len(numbers) if high is None else np.searchsorted(numbers, high, side='right' if include_high else 'left')
+
+    mask = np.zeros(index['rows'], dtype=bool)
+    mask[order[start:stop]] = True
+    return np.packbits(mask)
+
+
+def all_of(index, bitmaps):
+    return reduce(np.bitwise_and, bitmaps, all_rows(index))
+
+
+def any_of(index, bitmaps):
+    return reduce(np.bitwise_or, bitmaps, no_rows(index))
+
+
+# filters are a tuple of ('in', column, values) and ('range', column, low, high) entries, all of which have to match
+def apply_filters(index, filters):
+    bitmaps = []
+    for kind, column, *arguments in filters:
+        if kind == 'in':
+            bitmaps.append(value_bitmap(index, column, arguments[0]))
+        else:
+            bitmaps.append(range_bitmap(index, column, *arguments))
+    return all_of(index, bitmaps)
+
+
+def bitmap_mask(index, bitmap):
+    return np.unpackbits(bitmap, count=index['rows']).astype(bool)
+
+
+def bitmap_rows(index, bitmap):
+    return np.flatnonzero(bitmap_mask(index, bitmap))
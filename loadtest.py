@@ -0,0 +1,136 @@
+import pandas as pd
+import numpy as np
+import argparse
+from datetime import datetime
+import json
+import os
+import time
+
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+import benchmark
+import datacleaning
+from rollups import rollup_path, build_rollups
+from metrics import metrics_path, build_store, save_store
+
+# rerun latency harness for dashboard.py
+# builds cleaned datasets of growing size from the synthetic PA log in benchmark.py, then drives the dashboard headless
+# with streamlit's AppTest: every sidebar page, and on the demographics page every demographic option. the first visit
+# of a page (cold, caches get built) is timed on its own, then the page is rerun a few times like a widget click would
+# and the p50 / p95 of those reruns are reported per page and size, so we can see which page stops scaling first.
+#
+#   python loadtest.py --sizes 2000 20000 200000 --reruns 10
+#
+# run it from the repo folder (the cleaner needs uszips.csv)
+
+dashboard_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dashboard.py")
+demographics_page = "Support Breakdown by Demographics"
+
+
+# synthetic <size>_CLEAN.csv with its rollup / metrics files (and .parquet) in a folder of its own, since the dashboard
+# reads every *_CLEAN file. written in the same order as datacleaning.py, the parquet copy is only used if it's newer
+def build_dataset(data_dir, size, seed=0, parquet=False):
+    folder = os.path.abspath(os.path.join(data_dir, f"rows_{size}"))
+    clean_file = os.path.join(folder, f"synthetic_{size}_CLEAN.csv")
+    if os.path.exists(clean_file):
+        return folder
+
+    os.makedirs(folder, exist_ok=True)
+    raw_file = os.path.join(folder, f"synthetic_{size}.csv")
+    print(f"Generating and cleaning {size} rows: {raw_file}")
+    benchmark.write_pa_log(raw_file, size, seed=seed)
+    cleaned = datacleaning.clean_data(raw_file, engine='vectorized')
+    cleaned.to_csv(clean_file, index=False)
+    build_rollups(cleaned).to_csv(rollup_path(clean_file), index=False)
+    save_store(build_store(cleaned), metrics_path(clean_file))
+    if parquet:
+        datacleaning.write_parquet(cleaned, os.path.splitext(clean_file)[0] + ".parquet")
+    os.remove(raw_file)
+    return folder
+
+
+def timed_run(at, timeout):
+    start = time.perf_counter()
+    at.run(timeout=timeout)
+    seconds = time.perf_counter() - start
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    return seconds
+
+
+def measure(at, size, page, option, cold, reruns, timeout):
+    samples = [timed_run(at, timeout) for _ in range(reruns)]
+    return {
+        'size': size,
+        'page': page,
+        'option': option,
+        'cold_seconds': cold,
+        'p50_seconds': float(np.percentile(samples, 50)),
+        'p95_seconds': float(np.percentile(samples, 95)),
+        'reruns': samples,
+    }
+
+
+def load_test(folder, size, reruns, timeout):
+    results = []
+    cwd = os.getcwd()
+    os.chdir(folder)
+    try:
+        # every size starts from empty caches, so the cold numbers include loading and building the summaries
+        st.cache_resource.clear()
+        at = AppTest.from_file(dashboard_file, default_timeout=timeout)
+        timed_run(at, timeout)
+
+        for page in at.sidebar.radio[0].options:
+            at.sidebar.radio[0].set_value(page)
+            cold = timed_run(at, timeout)
+            results.append(measure(at, size, page, None, cold, reruns, timeout))
+
+            if page == demographics_page:
+                for option in at.selectbox[0].options:
+                    at.selectbox[0].set_value(option)
+                    cold = timed_run(at, timeout)
+                    results.append(measure(at, size, page, option, cold, reruns, timeout))
+    finally:
+        os.chdir(cwd)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure dashboard.py rerun latency on synthetic datasets")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[2000, 20000, 200000],
+                        help="rows in each synthetic dataset (default 2000 20000 200000)")
+    parser.add_argument("--reruns", type=int, default=5, help="warm reruns timed per page / option (default 5)")
+    parser.add_argument("--parquet", action="store_true", help="also write the typed parquet copy the dashboard prefers")
+    parser.add_argument("--timeout", type=float, default=600, help="seconds a single rerun may take before giving up")
+    parser.add_argument("--data-dir", default="benchmark_data", help="where the synthetic datasets are kept")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="loadtest_results.json")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        folder = build_dataset(args.data_dir, size, seed=args.seed, parquet=args.parquet)
+        results += load_test(folder, size, args.reruns, args.timeout)
+
+    # p95 rerun latency of every page (and demographic option) by dataset size
+    report = pd.DataFrame(results)
+    report['view'] = report['page'] + report['option'].map(lambda option: f" / {option}" if option else "")
+    table = report.pivot_table(index='view', columns='size', values='p95_seconds', sort=False)
+    print("\np95 rerun latency (seconds)")
+    print(table.round(3).to_string())
+
+    with open(args.output, 'w') as f:
+        json.dump({
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'streamlit': st.__version__,
+            'pandas': pd.__version__,
+            'parquet': args.parquet,
+            'results': results,
+        }, f, indent=2)
+    print(f"Saved load test results to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
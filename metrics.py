@@ -0,0 +1,175 @@
+import json
+import os
+
+import pandas as pd
+
+# key metric store for the Impact & Progress headline numbers
+# every approved grant adds to a per patient, per month record (grants, amount awarded, amount overspent) and to
+# running totals for all time, days to support is kept as a running sum and count per month. datacleaning.py keeps
+# the store next to the output as <stem>.metrics.json. appending a batch of rows only touches the months and patients
+# in that batch, so a monthly update is O(batch); a file whose existing rows changed or disappeared is rebuilt.
+# grants without a request date count toward the all time numbers but not toward any month.
+
+def metrics_path(output_file):
+    return os.path.splitext(output_file)[0] + ".metrics.json"
+
+
+# ids as text, so the csv text of an incremental run and a freshly cleaned frame land on the same patient ('' if missing)
+def patient_keys(ids):
+    numbers = pd.to_numeric(ids, errors='coerce')
+    whole = numbers.notna() & numbers.eq(numbers.round())
+    keys = ids.astype(object).astype(str).where(ids.notna() & ~ids.isin(['', 'NA', 'nan']), '')
+    keys[whole] = numbers[whole].astype('int64').astype(str)
+    return keys
+
+
+def empty_store():
+    return {
+        'totals': {'grants': 0, 'amount': 0.0, 'overspent': 0.0, 'patients': 0, 'returning': 0, 'days_sum': 0.0, 'days_count': 0},
+        'patients': {},
+        'months': {},
+    }
+
+
+# month of every row ('' if undated), days to support, and the approved grants with their patient, month, amount
+# and amount overspent
+def split_rows(df):
+    month = pd.to_datetime(pd.Series(df['grant_req_date']), errors='coerce').dt.to_period('M').dt.strftime('%Y-%m').fillna('').set_axis(df.index)
+    days = pd.to_numeric(df['days_to_support'], errors='coerce')
+    approved = df['request_status'].eq('Approved')
+    balance = pd.to_numeric(df['remaining_balance'][approved], errors='coerce')
+    grants = pd.DataFrame({
+        'patient': patient_keys(df['patient_id'][approved]),
+        'month': month[approved],
+        'amount': pd.to_numeric(df['amount'][approved], errors='coerce'),
+        'overspent': -balance.where(balance < 0),
+    })
+    return month, days, grants
+
+
+# adds a batch of rows to the store one month and patient at a time, fine for the few rows of an update
+def add_rows(store, df):
+    month, days, grants = split_rows(df)
+    for key, group in days.groupby(month):
+        record = store['months'].setdefault(key, {'days': [0.0, 0], 'patients': {}})
+        record['days'][0] += float(group.sum())
+        record['days'][1] += int(group.count())
+    store['totals']['days_sum'] += float(days.sum())
+    store['totals']['days_count'] += int(days.count())
+
+    totals = store['totals']
+    totals['grants'] += len(grants)
+    # money is kept to the cent, so adding a batch gives exactly the same totals as building it all in one go
+    totals['amount'] = round(totals['amount'] + float(grants['amount'].sum()), 2)
+    totals['overspent'] = round(totals['overspent'] + float(grants['overspent'].sum()), 2)
+
+    for (patient, key), group in grants.groupby(['patient', 'month']):
+        patients = store['months'].setdefault(key, {'days': [0.0, 0], 'patients': {}})['patients']
+        record = patients.setdefault(patient, [0, 0.0, 0.0])
+        record[0] += len(group)
+        record[1] = round(record[1] + float(group['amount'].sum()), 2)
+        record[2] = round(record[2] + float(group['overspent'].sum()), 2)
+
+    # patients without an id are in the amounts but, like nunique / value_counts, never counted as patients
+    for patient, count in grants.loc[grants['patient'] != '', 'patient'].value_counts().items():
+        before = store['patients'].get(patient, 0)
+        store['patients'][patient] = before + int(count)
+        totals['patients'] += int(before == 0)
+        totals['returning'] += int(before <= 1 < before + count)
+    return store
+
+
+# a whole file: one groupby per level, then the results turned into the same dicts add_rows would have built
+def build_store(df):
+    month, days, grants = split_rows(df)
+    store = empty_store()
+    by_month = days.groupby(month).agg(['sum', 'count'])
+    store['months'] = {
+        key: {'days': [total, count], 'patients': {}}
+        for key, total, count in zip(by_month.index.tolist(), by_month['sum'].tolist(), by_month['count'].tolist())
+    }
+
+    by_patient = grants.groupby(['month', 'patient']).agg(
+        grants=('amount', 'size'),
+        amount=('amount', 'sum'),
+        overspent=('overspent', 'sum'),
+    )
+    for (key, patient), count, amount, overspent in zip(by_patient.index.tolist(), by_patient['grants'].tolist(),
+                                                        by_patient['amount'].tolist(), by_patient['overspent'].tolist()):
+        store['months'][key]['patients'][patient] = [count, round(amount, 2), round(overspent, 2)]
+
+    counts = grants.loc[grants['patient'] != '', 'patient'].value_counts()
+    store['patients'] = dict(zip(counts.index.tolist(), counts.tolist()))
+    store['totals'] = {
+        'grants': len(grants),
+        'amount': round(float(grants['amount'].sum()), 2),
+        'overspent': round(float(grants['overspent'].sum()), 2),
+        'patients': len(counts),
+        'returning': int((counts > 1).sum()),
+        'days_sum': float(days.sum()),
+        'days_count': int(days.count()),
+    }
+    return store
+
+
+def load_store(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_store(store, path):
+    with open(path, 'w') as f:
+        json.dump(store, f)
+
+
+# the headline numbers for all time (period None), one year ('2024') or one month ('2024-03'). several stores (one
+# per cleaned file) are added together, patients are matched on their id across them
+def key_metrics(stores, period=None):
+    if period is None and len(stores) == 1:
+        totals = stores[0]['totals']
+        return {
+            'total_grants': totals['amount'],
+            'overspent': totals['overspent'],
+            'total_approved': totals['grants'],
+            'total_patients': totals['patients'],
+            'num_returning_patients': totals['returning'],
+            'avg_days': totals['days_sum'] / totals['days_count'] if totals['days_count'] else None,
+        }
+    if period is None:
+        patient_grants = {}
+        for store in stores:
+            for patient, count in store['patients'].items():
+                patient_grants[patient] = patient_grants.get(patient, 0) + count
+        days_sum = sum(store['totals']['days_sum'] for store in stores)
+        days_count = sum(store['totals']['days_count'] for store in stores)
+        return {
+            'total_grants': sum(store['totals']['amount'] for store in stores),
+            'overspent': sum(store['totals']['overspent'] for store in stores),
+            'total_approved': sum(store['totals']['grants'] for store in stores),
+            'total_patients': len(patient_grants),
+            'num_returning_patients': sum(count > 1 for count in patient_grants.values()),
+            'avg_days': days_sum / days_count if days_count else None,
+        }
+
+    patient_grants = {}
+    grants = amount = overspent = days_sum = days_count = 0
+    for store in stores:
+        for month, record in store['months'].items():
+            if not month.startswith(period):
+                continue
+            days_sum += record['days'][0]
+            days_count += record['days'][1]
+            for patient, (count, patient_amount, patient_overspent) in record['patients'].items():
+                grants += count
+                amount = round(amount + patient_amount, 2)
+                overspent = round(overspent + patient_overspent, 2)
+                if patient != '':
+                    patient_grants[patient] = patient_grants.get(patient, 0) + count
+    return {
+        'total_grants': amount,
+        'overspent': overspent,
+        'total_approved': grants,
+        'total_patients': len(patient_grants),
+        'num_returning_patients': sum(count > 1 for count in patient_grants.values()),
+        'avg_days': days_sum / days_count if days_count else None,
+    }
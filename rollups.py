@@ -0,0 +1,75 @@
+import os
+
+import pandas as pd
+
+# time series rollups for the Impact & Progress trend chart
+# number of requests, approved amount and distinct approved patients per day, week (starting monday) and month of the
+# grant request date. datacleaning.py works them out when it cleans a file and keeps them next to the output as
+# <stem>.rollup.csv, an --incremental run only rebuilds the periods its new, changed or removed rows fall in. the
+# dashboard then reads a few hundred rollup rows instead of grouping every grant again.
+
+granularities = {'Daily': 'D', 'Weekly': 'W', 'Monthly': 'M'}
+rollup_columns = ['granularity', 'period', 'requests', 'approved_amount', 'patients']
+
+
+def rollup_path(output_file):
+    return os.path.splitext(output_file)[0] + ".rollup.csv"
+
+
+# first day of the day / week / month each date falls in
+def period_starts(dates, granularity):
+    return pd.to_datetime(pd.Series(dates), errors='coerce').dt.to_period(granularities[granularity]).dt.start_time
+
+
+# periods (granularity -> period starts) limits the rollup to just those periods, for an incremental update
+def build_rollups(df, periods=None):
+    approved = df['request_status'].eq('Approved')
+    amount = pd.to_numeric(df['amount'], errors='coerce')
+
+    rollups = []
+    for granularity in granularities:
+        start = period_starts(df['grant_req_date'], granularity).set_axis(df.index)
+        rows = start.notna()
+        if periods is not None:
+            rows &= start.isin(periods[granularity])
+
+        grants = pd.DataFrame({
+            'period': start[rows],
+            'approved_amount': amount[rows].where(approved[rows]),
+            'patients': df['patient_id'][rows].where(approved[rows]),
+        })
+        rollup = grants.groupby('period').agg(
+            requests=('period', 'size'),
+            approved_amount=('approved_amount', 'sum'),
+            patients=('patients', 'nunique'),
+        ).reset_index()
+        rollup.insert(0, 'granularity', granularity)
+        rollups.append(rollup)
+
+    rollups = pd.concat(rollups, ignore_index=True)
+    rollups['period'] = rollups['period'].dt.strftime('%Y-%m-%d')
+    rollups['approved_amount'] = rollups['approved_amount'].round(2)  # cents, so a rebuilt period matches one read back from csv
+    return sort_rollups(rollups[rollup_columns])
+
+
+# throw away the periods any of the changed grant dates fall in and rebuild just those from the new data
+def update_rollups(rollups, df, changed_dates):
+    periods = {granularity: set(period_starts(changed_dates, granularity).dropna()) for granularity in granularities}
+
+    stale = pd.Series(False, index=rollups.index)
+    for granularity, starts in periods.items():
+        stale |= rollups['granularity'].eq(granularity) & pd.to_datetime(rollups['period']).isin(starts)
+
+    return sort_rollups(pd.concat([rollups[~stale], build_rollups(df, periods)], ignore_index=True))
+
+
+def sort_rollups(rollups):
+    order = rollups['granularity'].map(list(granularities).index)
+    return rollups.assign(order=order).sort_values(['order', 'period']).drop(columns='order').reset_index(drop=True)
+
+
+# rollups of several cleaned files added together. patients can only be summed, so a patient who shows up in two
+# files in the same period is counted twice (the same as every other total when the files overlap)
+def combine_rollups(rollups):
+    combined = rollups.groupby(['granularity', 'period'], as_index=False)[['requests', 'approved_amount', 'patients']].sum()
+    return sort_rollups(combined)
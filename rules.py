@@ -0,0 +1,95 @@
+import re
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+# rule tables for the regex classifiers in datacleaning.py
+# a classifier is declared once as an ordered {category: pattern} dict (same idea as assistance_patterns) and compiled
+# here into one big pattern with a named group per rule, so a cell is classified with a single regex call instead of
+# rebuilding the dict and running re.search once per category. every rule is wrapped in a lookahead anchored at the
+# start of the text, which keeps the "first rule in the list wins" behaviour of the old if/elif chains (a plain
+# alternation would pick whichever rule matches furthest left in the text instead).
+
+
+def compile_rules(patterns, flags=0, prepare=None):
+    categories = list(patterns)
+    names = [f"rule{i}" for i in range(len(categories))]
+
+    # first rule (in order) that matches anywhere in the text
+    first = '^(?:' + '|'.join(
+        f'(?=[\\s\\S]*?(?:{pattern}))(?P<{name}>)' for name, pattern in zip(names, patterns.values())) + ')'
+
+    # every rule that matches anywhere in the text (each lookahead is optional so they all get tried)
+    every = '^' + ''.join(
+        f'(?=(?:[\\s\\S]*?(?P<{name}>{pattern}))?)' for name, pattern in zip(names, patterns.values()))
+
+    return {
+        'categories': categories,
+        'names': names,
+        'patterns': [re.compile(pattern, flags) for pattern in patterns.values()],
+        'first': re.compile(first, flags),
+        'every': re.compile(every, flags),
+        # how the column text is normalized before the rules run (used by rule_report)
+        'prepare': prepare,
+    }
+
+
+# category of the first matching rule for one string, or None
+def match_rule(rules, text):
+    match = rules['first'].match(text)
+    if match is None:
+        return None
+    return rules['categories'][rules['names'].index(match.lastgroup)]
+
+
+# categories of every matching rule for one string, in rule order
+def matching_rules(rules, text):
+    match = rules['every'].match(text)
+    return [category for category, name in zip(rules['categories'], rules['names']) if match.group(name) is not None]
+
+
+def extract(text, pattern):
+    # the user patterns keep their own (unnamed) groups, pandas returns those as extra columns and we just ignore them
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', UserWarning)
+        return text.str.extract(pattern)
+
+
+# first matching category for a whole column of strings in one pass (None where nothing matched)
+def classify_column(rules, text):
+    groups = extract(text, rules['first'])[rules['names']]
+    matched = groups.notna().to_numpy()
+    categories = pd.Series(rules['categories'], dtype=object).to_numpy()
+
+    result = np.full(len(text), None, dtype=object)
+    any_match = matched.any(axis=1)
+    result[any_match] = categories[matched[any_match].argmax(axis=1)]
+    return pd.Series(result, index=text.index)
+
+
+# true/false for every rule on a whole column of strings in one pass (one column per category)
+def classify_all_column(rules, text):
+    groups = extract(text, rules['every'])[rules['names']]
+    return groups.notna().set_axis(rules['categories'], axis=1)
+
+
+# how many rows each rule ends up classifying, and how long each rule takes when run on its own over the column
+def rule_report(rules, series):
+    text = rules['prepare'](series) if rules['prepare'] is not None else series.astype(str)
+    assigned = classify_column(rules, text).value_counts()
+
+    report = []
+    for category, pattern in zip(rules['categories'], rules['patterns']):
+        start = time.perf_counter()
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', UserWarning)
+            matches = text.str.contains(pattern, na=False).sum()
+        report.append({
+            'category': category,
+            'rows': int(assigned.get(category, 0)),
+            'matches': int(matches),
+            'seconds': time.perf_counter() - start,
+        })
+    return pd.DataFrame(report)